@@ -1,12 +1,197 @@
-import argparse
-from src.metrics import eval_corpus
+import argparse, json, time
+from src.metrics import eval_corpus, eval_predictions, load_names
+from src.rules import add_punctuation
+
+def p95(times):
+    times_sorted = sorted(times)
+    return times_sorted[int(0.95*len(times))-1]
+
+# Timing columns, printed on their own rather than as metric deltas
+TIMING_KEYS = ("mean_ms", "p95_ms", "score_ms", "punct_us")
+
+def run_timed(pp, rows, golds, names_lex):
+    """Pipeline metrics over rows plus mean and p95 per-utterance latency"""
+    preds, times = [], []
+    for r in rows:
+        t0 = time.perf_counter()
+        preds.append(pp.process_one(r["text"]))
+        times.append((time.perf_counter() - t0) * 1000)
+    m = eval_predictions(preds, golds, names_lex)
+    m["mean_ms"] = sum(times) / len(times)
+    m["p95_ms"] = p95(times)
+    return m
+
+def sweep_pll_k(args):
+    """
+    Run the pipeline once per k (0 = full PLL) and report metric deltas vs full PLL
+    next to p95 latency. Every k, full PLL included, is scored through the batched
+    path, so the latency column measures sampling alone.
+    """
+    from src.postprocess_pipeline import PostProcessor
+    rows = [json.loads(line) for line in open(args.input, 'r', encoding='utf-8')]
+    golds = [json.loads(line)["text"] for line in open(args.gold, 'r', encoding='utf-8')]
+    names_lex = load_names(args.names)
+    pp = PostProcessor(args.names, onnx_model_path=args.onnx, misspell_map_path=args.misspell,
+                       pll_strategy=args.pll_strategy)
+    # Full PLL through score_full rather than one masked row per call
+    pp.ranker.batched = True
+    ks = [int(k) for k in args.sweep_k.split(",")]
+    if 0 not in ks:
+        ks = [0] + ks
+    results = {}
+    for k in ks:
+        pp.ranker.pll_k = k or None
+        results[k] = run_timed(pp, rows, golds, names_lex)
+
+    full = results[0]
+    print(f"strategy={args.pll_strategy} (deltas vs full PLL, all batched)")
+    for k in ks:
+        m = results[k]
+        label = "full" if k == 0 else f"k={k}"
+        cols = " ".join(f"{name}={m[name]:.4f}({m[name] - full[name]:+.4f})" for name in full if name not in TIMING_KEYS)
+        print(f"{label:>6} p95_ms={m['p95_ms']:.2f} {cols}")
+
+def compare_prerank(args):
+    """Run the pipeline without and with the pre-ranker: metric deltas, latency and pruning rates"""
+    from src.postprocess_pipeline import PostProcessor
+    rows = [json.loads(line) for line in open(args.input, 'r', encoding='utf-8')]
+    golds = [json.loads(line)["text"] for line in open(args.gold, 'r', encoding='utf-8')]
+    names_lex = load_names(args.names)
+    results = {}
+    for prerank in (False, True):
+        pp = PostProcessor(args.names, onnx_model_path=args.onnx, misspell_map_path=args.misspell,
+                           pll_strategy=args.pll_strategy, prerank=prerank, unigram_path=args.unigrams)
+        results[prerank] = (run_timed(pp, rows, golds, names_lex), pp.preranker)
+
+    base = results[False][0]
+    for prerank in (False, True):
+        m, pre = results[prerank]
+        label = "prerank" if prerank else "baseline"
+        cols = " ".join(f"{name}={m[name]:.4f}({m[name] - base[name]:+.4f})" for name in base)
+        print(f"{label:>8} {cols}")
+        if pre is not None:
+            print(" " * 9 + " ".join(f"{k}={v:.1%}" for k, v in pre.stats().items()))
+
+def ranking_agreement(ranker, cand_sets, ref_scores):
+    """Share of candidate sets where ranker picks the reference top candidate, share of candidate pairs
+    it orders like the reference, and the ms it spent scoring them"""
+    top1 = pairs = concordant = 0
+    t0 = time.perf_counter()
+    all_scores = [ranker.score(cands) for cands in cand_sets]
+    score_ms = (time.perf_counter() - t0) * 1000
+    for sc, ref in zip(all_scores, ref_scores):
+        top1 += int(max(range(len(sc)), key=sc.__getitem__) == max(range(len(ref)), key=ref.__getitem__))
+        for i in range(len(sc)):
+            for j in range(i + 1, len(sc)):
+                pairs += 1
+                # Same order, or tied in both
+                concordant += int((sc[i] > sc[j]) - (sc[i] < sc[j]) == (ref[i] > ref[j]) - (ref[i] < ref[j]))
+    return top1 / max(len(cand_sets), 1), concordant / max(pairs, 1), score_ms
+
+def reference_rankings(args):
+    """Full-model PostProcessor, its metrics, and its scores on every candidate set with a real choice"""
+    from src.postprocess_pipeline import PostProcessor
+    rows = [json.loads(line) for line in open(args.input, 'r', encoding='utf-8')]
+    golds = [json.loads(line)["text"] for line in open(args.gold, 'r', encoding='utf-8')]
+    names_lex = load_names(args.names)
+    full = PostProcessor(args.names, onnx_model_path=args.onnx, misspell_map_path=args.misspell, pll_strategy=args.pll_strategy)
+    base = run_timed(full, rows, golds, names_lex)
+    cand_sets = [c for c in (full._candidates(r["text"]) for r in rows) if len(c) > 1]
+    t0 = time.perf_counter()
+    ref_scores = [full.ranker.score(c) for c in cand_sets]
+    base["score_ms"] = (time.perf_counter() - t0) * 1000
+    print(f"{'full':>6} p95_ms={base['p95_ms']:.2f} score_ms={base['score_ms']:.1f} "
+          + " ".join(f"{k}={v:.4f}" for k, v in base.items() if k not in TIMING_KEYS))
+    return (rows, golds, names_lex), base, cand_sets, ref_scores
+
+def report_vs_full(label, pp, data, base, cand_sets, ref_scores):
+    m = run_timed(pp, *data)
+    top1, pair, score_ms = ranking_agreement(pp.ranker, cand_sets, ref_scores)
+    cols = " ".join(f"{k}={m[k]:.4f}({m[k] - base[k]:+.4f})" for k in base if k not in TIMING_KEYS)
+    print(f"{label:>6} p95_ms={m['p95_ms']:.2f} score_ms={score_ms:.1f} speedup={base['score_ms'] / score_ms:.2f}x "
+          f"same_top1={top1:.1%} pair_agreement={pair:.1%} {cols}")
+
+def compare_layers(args):
+    """Layer-truncated ranking tiers vs the full model: p95 latency, ranking agreement on the candidate sets, metric deltas"""
+    from src.postprocess_pipeline import PostProcessor
+    data, base, cand_sets, ref_scores = reference_rankings(args)
+    for n in [int(x) for x in args.compare_layers.split(",")]:
+        try:
+            pp = PostProcessor(args.names, onnx_model_path=args.onnx, misspell_map_path=args.misspell,
+                               pll_strategy=args.pll_strategy, ranker_layers=n)
+        except ValueError as e:
+            print(f"{'L' + str(n):>6} skipped: {e}")
+            continue
+        report_vs_full(f"L{n}", pp, data, base, cand_sets, ref_scores)
+
+def compare_vocab_head(args):
+    """Domain vocab head model vs the full-vocab model: scoring speedup, ranking agreement, metric deltas"""
+    from src.postprocess_pipeline import PostProcessor
+    data, base, cand_sets, ref_scores = reference_rankings(args)
+    pp = PostProcessor(args.names, onnx_model_path=args.compare_vocab_head, misspell_map_path=args.misspell,
+                       pll_strategy=args.pll_strategy)
+    if pp.ranker.vocab_map is None:
+        raise SystemExit(f"{args.compare_vocab_head} has no domain vocab head (build one with python -m src.vocab_head)")
+    print(f"domain head: {int(pp.ranker.vocab_map.max())} wordpieces + catch-all")
+    report_vs_full("domain", pp, data, base, cand_sets, ref_scores)
+
+def compare_punct(args):
+    """Rule punctuation vs the token tagger: PunctuationF1 and the other metrics, end-to-end p95, and the punctuation step alone"""
+    from src.postprocess_pipeline import PostProcessor
+    rows = [json.loads(line) for line in open(args.input, 'r', encoding='utf-8')]
+    golds = [json.loads(line)["text"] for line in open(args.gold, 'r', encoding='utf-8')]
+    names_lex = load_names(args.names)
+    base = None
+    for mode in ("rules", "tagger"):
+        pp = PostProcessor(args.names, onnx_model_path=args.onnx, misspell_map_path=args.misspell,
+                           pll_strategy=args.pll_strategy, punctuation=mode, tagger_path=args.tagger)
+        m = run_timed(pp, rows, golds, names_lex)
+        # The punctuation step on its own, on the texts the ranker picked
+        picked = [pp.ranker.choose_best(pp._candidates(r["text"])) for r in rows]
+        t0 = time.perf_counter()
+        for text in picked:
+            pp._finish(text if mode == "tagger" else add_punctuation(text))
+        m["punct_us"] = (time.perf_counter() - t0) * 1e6 / len(picked)
+        base = base or m
+        cols = " ".join(f"{k}={m[k]:.4f}({m[k] - base[k]:+.4f})" for k in base if k not in TIMING_KEYS)
+        print(f"{mode:>6} p95_ms={m['p95_ms']:.2f} punct_step_us={m['punct_us']:.1f} {cols}")
 
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--pred", default="out/corrected.jsonl")
     ap.add_argument("--gold", default="data/gold.jsonl")
     ap.add_argument("--names", default="data/names_lexicon.txt")
+    # --sweep_k runs the pipeline itself instead of reading --pred
+    ap.add_argument("--sweep_k", default=None, help="comma-separated PLL k values to compare against full PLL, e.g. 2,4,8")
+    ap.add_argument("--input", default="data/noisy_transcripts.jsonl")
+    ap.add_argument("--misspell", default="data/misspell_map.json")
+    ap.add_argument("--onnx", default="models/distilbert-base-uncased.int8.onnx")
+    ap.add_argument("--pll_strategy", default="stride", choices=["stride", "diff", "rare"])
+    # --compare_prerank also runs the pipeline itself
+    ap.add_argument("--compare_prerank", action="store_true", help="metrics/latency with vs without the candidate pre-ranker")
+    ap.add_argument("--unigrams", default=None, help="unigram count table for the pre-ranker")
+    # --compare_layers also runs the pipeline itself, once per ranking tier
+    ap.add_argument("--compare_layers", default=None, help="comma-separated layer tiers to compare with the full model, e.g. 2,3,4,5,6 "
+                    "(p95 latency and ranking agreement; no tier has been measured yet)")
+    ap.add_argument("--compare_vocab_head", default=None, help="domain vocab head model (python -m src.vocab_head; unvalidated) to compare with --onnx: top-1 agreement and latency")
+    ap.add_argument("--compare_punct", action="store_true", help="rule punctuation vs the token tagger (--tagger)")
+    ap.add_argument("--tagger", default="models/punct_tagger.onnx")
     args = ap.parse_args()
+    if args.compare_punct:
+        compare_punct(args)
+        return
+    if args.compare_vocab_head:
+        compare_vocab_head(args)
+        return
+    if args.compare_layers:
+        compare_layers(args)
+        return
+    if args.sweep_k:
+        sweep_pll_k(args)
+        return
+    if args.compare_prerank:
+        compare_prerank(args)
+        return
     m = eval_corpus(args.pred, args.gold, args.names)
     for k,v in m.items():
         print(f"{k}: {v:.4f}")
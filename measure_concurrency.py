@@ -0,0 +1,40 @@
+import argparse, json, time
+from concurrent.futures import ThreadPoolExecutor
+from src.postprocess_pipeline import PostProcessor
+
+def main():
+    """Stress one shared PostProcessor from many threads: throughput per thread count, and outputs must match a sequential run"""
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--input", default="data/noisy_transcripts.jsonl")
+    ap.add_argument("--names", default="data/names_lexicon.txt")
+    ap.add_argument("--misspell", default="data/misspell_map.json")
+    ap.add_argument("--onnx", default="models/distilbert-base-uncased.int8.onnx")
+    ap.add_argument("--threads", default="1,2,4,8", help="comma-separated caller thread counts")
+    ap.add_argument("--inference_threads", type=int, default=4, help="size of the shared ORT call pool")
+    ap.add_argument("--repeat", type=int, default=3, help="passes over the input per thread count")
+    args = ap.parse_args()
+
+    texts = [json.loads(line)["text"] for line in open(args.input, 'r', encoding='utf-8')]
+    pp = PostProcessor(args.names, onnx_model_path=args.onnx, misspell_map_path=args.misspell,
+                       inference_threads=args.inference_threads)
+
+    # Sequential reference outputs (also warms up the session and the caller's tokenizer)
+    reference = [pp.process_one(t) for t in texts]
+    work = list(range(len(texts))) * args.repeat
+
+    base = None
+    for n in [int(x) for x in args.threads.split(",")]:
+        with ThreadPoolExecutor(max_workers=n) as ex:
+            t0 = time.perf_counter()
+            outs = list(ex.map(lambda i: (i, pp.process_one(texts[i])), work))
+            dt = time.perf_counter() - t0
+        mismatches = sum(1 for i, o in outs if o != reference[i])
+        tput = len(work) / dt
+        base = base or tput
+        print(f"threads={n} utt_per_s={tput:.1f} speedup={tput / base:.2f}x mismatches={mismatches}")
+        if mismatches:
+            raise SystemExit("cross-talk: concurrent outputs differ from the sequential run")
+    pp.ranker.close()
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,18 @@
 import argparse, json, random, time
+import numpy as np
 from src.postprocess_pipeline import PostProcessor
+from src.rules import generate_candidates
 
-def main():
-    ap = argparse.ArgumentParser()
-    ap.add_argument("--input", default="data/noisy_transcripts.jsonl")
-    ap.add_argument("--names", default="data/names_lexicon.txt")
-    ap.add_argument("--onnx", default="models/distilbert-base-uncased.int8.onnx")
-    ap.add_argument("--device", default="cpu")
-    ap.add_argument("--runs", type=int, default=100)
-    ap.add_argument("--warmup", type=int, default=10)
-    args = ap.parse_args()
-
-    rows = [json.loads(line) for line in open(args.input, 'r', encoding='utf-8')]
-    texts = [r["text"] for r in rows][:50]
-    pp = PostProcessor(args.names, onnx_model_path=args.onnx, device=args.device, max_length=64)
+def build(args, backend):
+    return PostProcessor(args.names, onnx_model_path=args.onnx if backend == "onnx" else None, device=args.device, max_length=args.max_length,
+                         misspell_map_path=args.misspell,
+                         search=args.search, beam_width=args.beam, latency_budget_ms=args.budget_ms,
+                         pll_k=args.pll_k, pll_strategy=args.pll_strategy, windowed=args.windowed,
+                         cache_size=args.cache_size, cache_path=args.cache_db,
+                         ranker_layers=args.layers, punctuation=args.punctuation, tagger_path=args.tagger,
+                         profile_path=args.profile or None)
 
+def bench(pp, texts, args):
     # Warmup
     for _ in range(args.warmup):
         _ = pp.process_one(texts[0])
@@ -29,8 +27,63 @@ def main():
     times_sorted = sorted(times)
     p50 = times_sorted[int(0.5*len(times))-1]
     p95 = times_sorted[int(0.95*len(times))-1]
+    return p50, p95
+
+def compare(pps, texts):
+    """Candidate scores of the Torch backend vs the ONNX one: score gap and how often both pick the same candidate"""
+    onnx_pp, torch_pp = pps["onnx"], pps["torch"]
+    diffs, agree, n = [], 0, 0
+    for t in texts:
+        cands = generate_candidates(t, onnx_pp.names_lex, onnx_pp.replacer)
+        a = onnx_pp.ranker.score(cands)
+        b = torch_pp.ranker.score(cands)
+        diffs += [abs(x - y) for x, y in zip(a, b)]
+        agree += int(np.argmax(a) == np.argmax(b))
+        n += 1
+    print(f"onnx_vs_torch: max_abs_score_diff={max(diffs):.3f} mean_abs_score_diff={np.mean(diffs):.3f} "
+          f"same_choice={agree}/{n}")
 
-    print(f"p50_ms={p50:.2f} p95_ms={p95:.2f} (runs={args.runs})")
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--input", default="data/noisy_transcripts.jsonl")
+    ap.add_argument("--names", default="data/names_lexicon.txt")
+    ap.add_argument("--misspell", default="data/misspell_map.json")
+    ap.add_argument("--onnx", default="models/distilbert-base-uncased.int8.onnx")
+    ap.add_argument("--backend", default="onnx", choices=["onnx", "torch", "both"], help="'both' also compares their scores")
+    ap.add_argument("--device", default="cpu")
+    ap.add_argument("--search", default="candidates", choices=["candidates", "lattice"])
+    ap.add_argument("--beam", type=int, default=8)
+    ap.add_argument("--budget_ms", type=float, default=None, help="latency budget (beam width / PLL positions adapt to it)")
+    ap.add_argument("--pll_k", type=int, default=None, help="score only k masked positions per candidate (default: all)")
+    ap.add_argument("--pll_strategy", default="stride", choices=["stride", "diff", "rare"])
+    ap.add_argument("--windowed", action="store_true", help="score inputs longer than max_length in overlapping windows")
+    ap.add_argument("--cache_size", type=int, default=0, help="in-process result cache entries (0 = off)")
+    ap.add_argument("--cache_db", default=None, help="SQLite result cache shared by all workers on the host")
+    ap.add_argument("--layers", type=int, default=None, help="rank with the N-layer model tier (python -m src.export_onnx --layers N; "
+                    "unmeasured: check it with evaluate.py --compare_layers first)")
+    ap.add_argument("--punctuation", default="rules", choices=["rules", "tagger"], help="punctuation/casing from the rules or the token tagger")
+    ap.add_argument("--tagger", default="models/punct_tagger.onnx", help="punctuation tagger model (python -m src.punct_tagger)")
+    ap.add_argument("--profile", default="models/tuned_profile.json", help="tuned host profile (python -m src.autotune); '' = defaults")
+    ap.add_argument("--max_length", type=int, default=64)
+    ap.add_argument("--limit", type=int, default=50, help="distinct inputs cycled through (0 = all, e.g. for synthetic data)")
+    ap.add_argument("--runs", type=int, default=100)
+    ap.add_argument("--warmup", type=int, default=10)
+    args = ap.parse_args()
+
+    rows = [json.loads(line) for line in open(args.input, 'r', encoding='utf-8')]
+    texts = [r["text"] for r in rows][:args.limit or None]
+    backends = ["onnx", "torch"] if args.backend == "both" else [args.backend]
+    pps = {}
+    for backend in backends:
+        pp = pps[backend] = build(args, backend)
+        p50, p95 = bench(pp, texts, args)
+        prefix = f"{backend}: " if len(backends) > 1 else ""
+        print(f"{prefix}p50_ms={p50:.2f} p95_ms={p95:.2f} (runs={args.runs})")
+        stats = pp.cache_stats()
+        if stats:
+            print(f"cache_hit_rate={stats['hit_rate']:.1%} (mem={stats['hits_mem']} disk={stats['hits_disk']} miss={stats['misses']})")
+    if len(backends) > 1:
+        compare(pps, texts)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,193 @@
+import argparse, gc, json, os, platform, re, statistics, sys, time, tracemalloc
+from src import rules
+from src.replacer import MisspellReplacer
+
+# Public rule functions benchmarked one by one; each takes a text and the loaded resources
+FUNCS = {
+    "normalize_text": lambda s, r: rules.normalize_text(s, r["replacer"]),
+    "normalize_email_tokens": lambda s, r: rules.normalize_email_tokens(s),
+    "fix_email_spacing": lambda s, r: rules.fix_email_spacing(s),
+    "normalize_numbers_spoken": lambda s, r: rules.normalize_numbers_spoken(s),
+    "normalize_currency": lambda s, r: rules.normalize_currency(s),
+    "correct_names_with_lexicon": lambda s, r: rules.correct_names_with_lexicon(s, r["names_lex"]),
+    "add_punctuation": lambda s, r: rules.add_punctuation(s),
+    "generate_candidates": lambda s, r: rules.generate_candidates(s, r["names_lex"], r["replacer"]),
+}
+
+def adversarial_cases(texts):
+    """Inputs that stress one rule each: long utterances, long digit/letter runs, email-like spam, no-match text"""
+    return {
+        "long": " ".join(texts),
+        "digits": " ".join(["nine", "double", "five", "triple", "zero", "one"] * 100),
+        "spelled": " ".join("a b c d e f g h" for _ in range(100)),
+        "emails": " ".join(f"user{i} dot name at g mail dot com or user{i}@gmailcom" for i in range(50)),
+        "at_signs": " @ ".join(["x"] * 300),
+        "rupees": " ".join(f"rs {i}00000 or ₹ {i}9,99.50" for i in range(100)),
+        "lower_words": " ".join(["kiran", "please", "confirm", "siddharth", "tomorrow"] * 100),
+        "spaces": "pls" + " " * 2000 + "confirm",
+        "empty": "",
+    }
+
+REFERENCE_RE = re.compile(r'[^a-z0-9@.]+')
+
+def reference_workload(s, r):
+    """Fixed stdlib-only work (regex, split, join) timed next to the rules to track the host's speed"""
+    return ' '.join(w.capitalize() for w in REFERENCE_RE.sub(' ', s.lower()).split())
+
+def calibrate(fn, inputs, res, min_time):
+    """Loop count that makes one timing run of fn over inputs take at least min_time"""
+    loops = 1
+    while _run(fn, inputs, res, loops) < min_time * 1e9 and loops < 1 << 20:
+        loops *= 2
+    return loops
+
+def _run(fn, inputs, res, loops):
+    t0 = time.perf_counter_ns()
+    for _ in range(loops):
+        for s in inputs:
+            fn(s, res)
+    return time.perf_counter_ns() - t0
+
+def time_call(fn, inputs, res, loops, repeat):
+    """Mean ns per call over inputs for each of repeat timing runs (timeit style: gc off)"""
+    gc_was = gc.isenabled()
+    gc.disable()
+    try:
+        return [_run(fn, inputs, res, loops) / (loops * len(inputs)) for _ in range(repeat)]
+    finally:
+        if gc_was:
+            gc.enable()
+
+def alloc_call(fn, inputs, res):
+    """Mean peak bytes allocated above the starting point during one call (tracemalloc)"""
+    for s in inputs:
+        fn(s, res)   # warm regex / lookup caches so they don't count
+    total = 0
+    tracemalloc.start()
+    try:
+        for s in inputs:
+            gc.collect()
+            before, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            fn(s, res)
+            _, peak = tracemalloc.get_traced_memory()
+            total += peak - before
+    finally:
+        tracemalloc.stop()
+    return total / len(inputs)
+
+def run_suite(args):
+    texts = [json.loads(line)["text"] for line in open(args.input, 'r', encoding='utf-8')]
+    res = {
+        "names_lex": [x.strip() for x in open(args.names, 'r', encoding='utf-8') if x.strip()],
+        "replacer": MisspellReplacer(args.misspell, rules.BUILTIN_REPLACEMENTS),
+    }
+    cases = {"representative": texts}
+    cases.update({f"adv:{k}": [v] for k, v in adversarial_cases(texts).items()})
+    only = set(args.only.split(",")) if args.only else set(FUNCS)
+    unknown = only - set(FUNCS)
+    if unknown:
+        raise SystemExit(f"unknown rule functions {sorted(unknown)}; expected some of {list(FUNCS)}")
+    rows = {f"{name}/{case}": (fn, inputs) for name, fn in FUNCS.items() if name in only for case, inputs in cases.items()}
+    ref = (reference_workload, texts)
+    loops = {key: calibrate(fn, inputs, res, args.min_time) for key, (fn, inputs) in {"reference": ref, **rows}.items()}
+    # Host speed can swing within milliseconds (shared or throttled cores), so
+    # every row takes the best of many short runs spread over interleaved rounds
+    # (min-of-N), relative to the reference workload's best; a whole run on a
+    # slower host moves the reference along with the rows. Noise is how far the
+    # best of the odd rounds and the best of the even rounds disagree.
+    samples = {key: [] for key in ("reference", *rows)}
+    for _ in range(args.rounds):
+        for key, (fn, inputs) in {"reference": ref, **rows}.items():
+            samples[key].append(min(time_call(fn, inputs, res, loops[key], args.repeat)))
+    ref_ns = min(samples["reference"])
+    results = {}
+    for key, (fn, inputs) in rows.items():
+        best = min(samples[key])
+        halves = [min(samples[key][i::2]) / min(samples["reference"][i::2]) for i in (0, 1)]
+        peak = alloc_call(fn, inputs, res)
+        results[key] = {"ns": round(best, 1), "rel": round(best / ref_ns, 5),
+                        "noise": round(abs(halves[0] - halves[1]) / min(halves), 4), "peak_B": round(peak)}
+        r = results[key]
+        print(f"{key:<50} {r['ns']:>14,.0f} ns/call ({r['rel']:>10.3f}x ref, noise {r['noise']:5.1%}) "
+              f"{peak:>12,.0f} peak_B", flush=True)
+    return {
+        "meta": {"python": platform.python_version(), "machine": platform.machine(), "node": platform.node(),
+                 "rules_version": rules.RULES_VERSION, "created": time.strftime("%Y-%m-%dT%H:%M:%S")},
+        "results": results,
+    }
+
+def compare(base, cur, threshold, min_ns, min_bytes):
+    """
+    Rows that got slower (or allocate more) than baseline by more than threshold.
+    Time is compared relative to the reference workload, and the allowed slowdown
+    widens by the round-to-round noise of either run; tiny absolute deltas are noise.
+    """
+    regressions = []
+    for key, c in cur["results"].items():
+        b = base["results"].get(key)
+        if b is None:
+            print(f"{key:<50} (new, no baseline)")
+            continue
+        if "rel" not in b:
+            raise SystemExit("baseline has no reference-relative timings; re-create it with: python measure_rules.py run --save")
+        d_ns = c["rel"] / b["rel"] - 1 if b["rel"] else 0.0
+        d_mem = c["peak_B"] / b["peak_B"] - 1 if b["peak_B"] else 0.0
+        allowed = threshold + max(b["noise"], c["noise"])
+        slow = d_ns > allowed and c["ns"] - b["ns"] > min_ns
+        fat = d_mem > threshold and c["peak_B"] - b["peak_B"] > min_bytes
+        flag = " <-- REGRESSION" if slow or fat else ""
+        print(f"{key:<50} {b['ns']:>12,.0f} -> {c['ns']:>12,.0f} ns ({d_ns:+7.1%} vs ref, allowed {allowed:+.0%})  "
+              f"{b['peak_B']:>10,} -> {c['peak_B']:>10,} peak_B ({d_mem:+7.1%}){flag}")
+        if flag:
+            regressions.append(key)
+    return regressions
+
+def main():
+    """Per-function microbenchmarks for src/rules.py: ns/call and allocations, saved as baselines and compared against them"""
+    ap = argparse.ArgumentParser()
+    ap.add_argument("command", choices=["run", "compare"], help="'run' measures (and --save stores a baseline); "
+                    "'compare' measures and exits non-zero on regressions against --baseline")
+    ap.add_argument("--input", default="data/noisy_transcripts.jsonl", help="representative inputs")
+    ap.add_argument("--names", default="data/names_lexicon.txt")
+    ap.add_argument("--misspell", default="data/misspell_map.json")
+    ap.add_argument("--only", default="", help="comma-separated rule functions (default: all)")
+    ap.add_argument("--min_time", type=float, default=0.01, help="seconds per timing run")
+    ap.add_argument("--repeat", type=int, default=3, help="timing runs per row and round")
+    ap.add_argument("--rounds", type=int, default=8, help="interleaved rounds over all rows; the best run counts")
+    ap.add_argument("--baseline", default="out/rules_baseline.json")
+    ap.add_argument("--save", action="store_true", help="write this run to --baseline (run)")
+    ap.add_argument("--threshold", type=float, default=0.25, help="allowed relative slowdown / allocation growth (compare)")
+    ap.add_argument("--min_ns", type=float, default=500, help="ignore slowdowns smaller than this many ns/call (compare)")
+    ap.add_argument("--min_bytes", type=int, default=1024, help="ignore allocation growth smaller than this (compare)")
+    args = ap.parse_args()
+
+    if args.command == "compare":
+        if not os.path.exists(args.baseline):
+            raise SystemExit(f"no baseline at {args.baseline}; create one with: python measure_rules.py run --save")
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            base = json.load(f)
+    cur = run_suite(args)
+    if args.command == "run":
+        if args.save:
+            os.makedirs(os.path.dirname(args.baseline) or ".", exist_ok=True)
+            with open(args.baseline, 'w', encoding='utf-8') as f:
+                json.dump(cur, f, indent=1, sort_keys=True)
+            print(f"baseline -> {args.baseline}")
+        return
+    bm, cm = base["meta"], cur["meta"]
+    if (bm["python"], bm["machine"], bm["node"]) != (cm["python"], cm["machine"], cm["node"]):
+        print(f"warning: baseline from {bm['node']} python {bm['python']}, now {cm['node']} python {cm['python']}; "
+              f"timings may not be comparable", file=sys.stderr)
+    print(f"--- vs baseline {args.baseline} ({bm['created']}, threshold {args.threshold:.0%})")
+    regressions = compare(base, cur, args.threshold, args.min_ns, args.min_bytes)
+    noise = statistics.median(r["noise"] for r in cur["results"].values())
+    if noise > args.threshold:
+        print(f"warning: median round-to-round noise {noise:.0%} exceeds the threshold; the host is too busy "
+              f"for this run to catch regressions, re-run it", file=sys.stderr)
+    if regressions:
+        raise SystemExit(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+    print("no regressions")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import argparse, json, os, subprocess, sys, tempfile, time
+from src.client import WorkerClient
+
+def file_path(args, texts):
+    """run_pipeline.py once per input file: process startup + JSONL round trip per file"""
+    with tempfile.TemporaryDirectory() as tmp:
+        chunk = -(-len(texts) // args.files)
+        t0 = time.perf_counter()
+        for f in range(args.files):
+            inp, out = os.path.join(tmp, f"in{f}.jsonl"), os.path.join(tmp, f"out{f}.jsonl")
+            with open(inp, "w", encoding="utf-8") as fh:
+                for i, t in enumerate(texts[f * chunk:(f + 1) * chunk]):
+                    fh.write(json.dumps({"id": str(i), "text": t}, ensure_ascii=False) + "\n")
+            subprocess.run([sys.executable, args.pipeline, "--input", inp, "--output", out, "--names", args.names,
+                            "--misspell", args.misspell, "--onnx", args.onnx], check=True, stdout=subprocess.DEVNULL)
+        return time.perf_counter() - t0
+
+def worker_path(args, texts, batch_size):
+    t0 = time.perf_counter()
+    with WorkerClient(["--names", args.names, "--misspell", args.misspell, "--onnx", args.onnx,
+                       "--batch_size", str(batch_size), "--batch_wait_ms", str(args.batch_wait_ms)],
+                      codec=args.codec, worker=args.worker) as client:
+        client.process("warm up")
+        startup = time.perf_counter() - t0
+        # One request at a time: per-request latency with no batching opportunity
+        lat = []
+        for t in texts[:args.single]:
+            t1 = time.perf_counter()
+            client.process(t)
+            lat.append((time.perf_counter() - t1) * 1000)
+        t1 = time.perf_counter()
+        client.process_many(texts)
+        stream = time.perf_counter() - t1
+    lat.sort()
+    return startup, stream, lat[len(lat) // 2] if lat else 0.0
+
+def main():
+    """Throughput of the file-based run_pipeline path vs one persistent worker, with and without micro-batching"""
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--input", default="data/noisy_transcripts.jsonl")
+    ap.add_argument("--names", default="data/names_lexicon.txt")
+    ap.add_argument("--misspell", default="data/misspell_map.json")
+    ap.add_argument("--onnx", default="models/distilbert-base-uncased.int8.onnx")
+    ap.add_argument("--codec", default="json", choices=["json", "msgpack"])
+    ap.add_argument("--files", type=int, default=10, help="input split into this many run_pipeline.py invocations")
+    ap.add_argument("--batch_sizes", default="1,8,32", help="worker micro-batch sizes to compare")
+    ap.add_argument("--batch_wait_ms", type=float, default=2.0)
+    ap.add_argument("--single", type=int, default=20, help="requests sent one at a time for the latency column")
+    ap.add_argument("--pipeline", default="run_pipeline.py")
+    ap.add_argument("--worker", default="worker.py")
+    args = ap.parse_args()
+
+    texts = [json.loads(line)["text"] for line in open(args.input, 'r', encoding='utf-8')]
+    dt = file_path(args, texts)
+    print(f"file_path files={args.files} utt={len(texts)} total_s={dt:.2f} utt_per_s={len(texts) / dt:.1f}")
+    for b in [int(x) for x in args.batch_sizes.split(",")]:
+        startup, stream, p50 = worker_path(args, texts, b)
+        print(f"worker batch_size={b} startup_s={startup:.2f} stream_s={stream:.2f} "
+              f"utt_per_s={len(texts) / stream:.1f} single_p50_ms={p50:.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,83 @@
 import argparse, os
-from src.postprocess_pipeline import run_file
+from src.postprocess_pipeline import PostProcessor, run_file
+from src import batch_job
 
 def main():
     ap = argparse.ArgumentParser()
-    ap.add_argument("--input", default="data/noisy_transcripts.jsonl")
+    ap.add_argument("--input", nargs="+", default=["data/noisy_transcripts.jsonl"], help="JSONL input (several for --job coordinate)")
     ap.add_argument("--output", default="out/corrected.jsonl")
     ap.add_argument("--names", default="data/names_lexicon.txt")
+    ap.add_argument("--misspell", default="data/misspell_map.json")
     ap.add_argument("--onnx", default="models/distilbert-base-uncased.int8.onnx")
     ap.add_argument("--device", default="cpu")
+    ap.add_argument("--search", default="candidates", choices=["candidates", "lattice"])
+    ap.add_argument("--beam", type=int, default=8)
+    ap.add_argument("--budget_ms", type=float, default=None, help="latency budget (beam width / PLL positions adapt to it)")
+    ap.add_argument("--pll_k", type=int, default=None, help="score only k masked positions per candidate (default: all)")
+    ap.add_argument("--pll_strategy", default="stride", choices=["stride", "diff", "rare"])
+    ap.add_argument("--windowed", action="store_true", help="score inputs longer than max_length in overlapping windows")
+    ap.add_argument("--cache_size", type=int, default=0, help="in-process result cache entries (0 = off)")
+    ap.add_argument("--cache_ttl", type=float, default=None, help="cached result lifetime in seconds")
+    ap.add_argument("--cache_db", default=None, help="SQLite result cache shared by all workers on the host")
+    ap.add_argument("--share_weights", action="store_true", help="memory-map the model's external weights (shared across worker processes)")
+    ap.add_argument("--prerank", action="store_true", help="drop dominated candidates with a cheap cascade before the MLM "
+                    "(WER/punct F1 parity checked on a toy model only, not yet on the real one)")
+    ap.add_argument("--unigrams", default=None, help="unigram count table for the pre-ranker (python -m src.prerank)")
+    ap.add_argument("--layers", type=int, default=None, help="rank with the N-layer model tier (python -m src.export_onnx --layers N; "
+                    "unmeasured: check it with evaluate.py --compare_layers first)")
+    ap.add_argument("--punctuation", default="rules", choices=["rules", "tagger"], help="punctuation/casing from the rules or the token tagger")
+    ap.add_argument("--tagger", default="models/punct_tagger.onnx", help="punctuation tagger model (python -m src.punct_tagger)")
+    ap.add_argument("--pipeline_depth", type=int, default=0,
+                    help="overlap rules and inference with a queue of this many prepared utterances (0 = sequential)")
+    ap.add_argument("--profile", default="models/tuned_profile.json", help="tuned host profile (python -m src.autotune); '' = defaults")
+    ap.add_argument("--job", default=None, choices=["coordinate", "work"],
+                    help="distributed batch job: 'coordinate' splits --input into queued chunks, waits and merges into --output; "
+                         "'work' processes chunks (run on every host)")
+    ap.add_argument("--job_dir", default="out/job", help="batch job directory shared by the coordinator and all workers")
+    ap.add_argument("--chunk_size", type=int, default=500, help="rows per chunk (coordinate)")
+    ap.add_argument("--queue", default=None, help="work queue, 'fs:<dir>' or 'sqlite:<path>' (coordinate; default fs:<job_dir>/queue)")
+    ap.add_argument("--lease_s", type=float, default=300, help="a chunk lease not renewed for this long is retried elsewhere (coordinate)")
+    ap.add_argument("--max_attempts", type=int, default=3, help="leases per chunk before it is failed (coordinate)")
     args = ap.parse_args()
+    opts = dict(onnx_model_path=args.onnx, device=args.device, misspell_map_path=args.misspell,
+                search=args.search, beam_width=args.beam, latency_budget_ms=args.budget_ms,
+                pll_k=args.pll_k, pll_strategy=args.pll_strategy, windowed=args.windowed,
+                cache_size=args.cache_size, cache_ttl_s=args.cache_ttl, cache_path=args.cache_db,
+                share_weights=args.share_weights,
+                prerank=args.prerank, unigram_path=args.unigrams, ranker_layers=args.layers,
+                punctuation=args.punctuation, tagger_path=args.tagger, profile_path=args.profile or None)
+    if args.job == "coordinate":
+        job = batch_job.create_job(args.job_dir, args.input, args.chunk_size, queue_spec=args.queue,
+                                   lease_s=args.lease_s, max_attempts=args.max_attempts)
+        print(f"job {args.job_dir}: {job['chunks']} chunks of {job['chunk_size']} rows on {job['queue']}")
+        counts = batch_job.wait(args.job_dir)
+        if counts["failed"]:
+            errors = batch_job.open_job(args.job_dir)[1].errors()
+            raise SystemExit(f"{counts['failed']} chunk(s) failed after {job['max_attempts']} attempts; last errors: {errors}")
+        n = batch_job.merge(args.job_dir, args.output)
+        print(f"merged {n} rows -> {args.output}")
+        return
+    if args.job == "work":
+        pp = PostProcessor(args.names, **opts)
+
+        def process(texts):
+            if args.pipeline_depth > 0:
+                return pp.process_pipelined(texts, args.pipeline_depth)[0]
+            return [pp.process_one(t) for t in texts]
+
+        n = batch_job.work(args.job_dir, process)
+        print(f"worker finished: {n} chunks completed here")
+        return
+    if len(args.input) != 1:
+        ap.error("several --input files need --job coordinate")
     os.makedirs(os.path.dirname(args.output), exist_ok=True)
-    run_file(args.input, args.output, args.names, onnx_model_path=args.onnx, device=args.device)
+    stats = run_file(args.input[0], args.output, args.names, pipeline_depth=args.pipeline_depth, **opts)
+    if "hit_rate" in stats:
+        print(f"cache: {stats['hits_mem']} mem hits, {stats['hits_disk']} disk hits, {stats['misses']} misses "
+              f"(hit rate {stats['hit_rate']:.1%})")
+    if "wall_s" in stats:
+        print(f"pipeline: {stats['wall_s']:.2f}s, rules stage busy {stats['prepare_util']:.0%} (blocked {stats['blocked_util']:.0%}), "
+              f"inference stage busy {stats['infer_util']:.0%} (starved {stats['starved_util']:.0%})")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,159 @@
+import json
+import os
+import platform
+import time
+import warnings
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from .ranker_onnx import EXECUTION_MODES, GRAPH_OPT_LEVELS
+
+# Tuned profile: the ranker settings (ranker_onnx.TUNING_KEYS) that benchmarked
+# best on this host, written by `python -m src.autotune` and loaded by
+# PostProcessor at startup. A profile only applies on the host shape it was
+# tuned on (CPU count, architecture, onnxruntime version) and for the same
+# model file; otherwise it is ignored with a warning.
+
+DEFAULT_PROFILE_PATH = "models/tuned_profile.json"
+OBJECTIVES = ('latency', 'throughput')
+
+
+def host_info() -> Dict[str, str]:
+    try:
+        import onnxruntime as ort  # type: ignore
+        ort_version = ort.__version__
+    except Exception:
+        ort_version = None
+    return {"cpu_count": os.cpu_count(), "machine": platform.machine(), "onnxruntime": ort_version}
+
+
+def load_profile(path: Optional[str], model_path: Optional[str]) -> Dict:
+    """Settings of the profile at path, or {} if there is none or it was tuned for another host / model"""
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        profile = json.load(f)
+    if profile.get("host") != host_info():
+        warnings.warn(f"ignoring tuned profile {path}: tuned on {profile.get('host')}, this host is {host_info()}")
+        return {}
+    if model_path and profile.get("model") != os.path.basename(model_path):
+        warnings.warn(f"ignoring tuned profile {path}: tuned for {profile.get('model')}, not {os.path.basename(model_path)}")
+        return {}
+    return dict(profile.get("settings", {}))
+
+
+def search_space(cpu_count: int) -> Dict[str, List]:
+    """Values tried per setting; the first one is the untuned default"""
+    threads = [1] + [t for t in (2, 4, 8, 16, 32, 64) if t <= cpu_count]
+    if cpu_count not in threads:
+        threads.append(cpu_count)
+    return {
+        "batched": [False, True],
+        "intra_op_threads": threads,
+        "inter_op_threads": [1, 2] if cpu_count > 1 else [1],
+        "execution_mode": list(EXECUTION_MODES),
+        "graph_opt_level": ["all"] + [g for g in GRAPH_OPT_LEVELS if g not in ("all", "disable")],
+        "max_batch_rows": [32, 16, 64, 128, 256],
+        "seq_bucket": [0, 8, 16],
+    }
+
+
+def benchmark(make_ranker: Callable, settings: Dict, cand_sets: List[List[str]], objective: str,
+              repeat: int, batch_size: int) -> float:
+    """Cost of settings (lower is better): p95 ms per utterance, or ms per utterance over batches of utterances"""
+    ranker = make_ranker(settings)
+    try:
+        ranker.score(cand_sets[0])   # warm up
+        if objective == 'latency':
+            times = []
+            for _ in range(repeat):
+                for cands in cand_sets:
+                    t0 = time.perf_counter()
+                    ranker.score(cands)
+                    times.append((time.perf_counter() - t0) * 1000)
+            return float(np.percentile(times, 95))
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            for i in range(0, len(cand_sets), batch_size):
+                ranker.score_full([c for cands in cand_sets[i:i + batch_size] for c in cands])
+        return (time.perf_counter() - t0) * 1000 / (repeat * len(cand_sets))
+    finally:
+        ranker.close()
+
+
+def tune(make_ranker: Callable, cand_sets: List[List[str]], objective: str = 'latency', repeat: int = 3,
+         batch_size: int = 16, space: Dict[str, List] = None, log: Callable = print) -> Dict:
+    """
+    Coordinate descent over the search space: each setting in turn takes the value
+    that benchmarks best with the others held at their current best. Passes repeat
+    until nothing changes (at most 3). Returns the best settings and their cost.
+    """
+    if objective not in OBJECTIVES:
+        raise ValueError(f"objective must be one of {OBJECTIVES}, got {objective!r}")
+    space = space or search_space(os.cpu_count() or 1)
+    if objective == 'throughput':
+        # Throughput is measured on the batched path only
+        space = {**space, "batched": [True]}
+    best = {k: v[0] for k, v in space.items()}
+    best_cost = benchmark(make_ranker, best, cand_sets, objective, repeat, batch_size)
+    baseline = best_cost
+    log(f"default {best_cost:.2f}")
+    for _ in range(3):
+        changed = False
+        for key, values in space.items():
+            if key in ('max_batch_rows', 'seq_bucket') and not best['batched']:
+                continue   # only used on the batched path
+            for v in values:
+                if v == best[key]:
+                    continue
+                trial = {**best, key: v}
+                cost = benchmark(make_ranker, trial, cand_sets, objective, repeat, batch_size)
+                log(f"{key}={v} {cost:.2f}")
+                # Require a clear win so timing noise does not pick settings
+                if cost < best_cost * 0.97:
+                    best, best_cost, changed = trial, cost, True
+        if not changed:
+            break
+    return {"settings": best, "cost": best_cost, "default_cost": baseline}
+
+
+if __name__ == "__main__":
+    import argparse
+    from .postprocess_pipeline import PostProcessor
+    from .ranker_onnx import PseudoLikelihoodRanker
+    ap = argparse.ArgumentParser(description="Benchmark ranker settings on this host and write a tuned profile")
+    ap.add_argument("--input", default="data/noisy_transcripts.jsonl", help="sample transcripts")
+    ap.add_argument("--names", default="data/names_lexicon.txt")
+    ap.add_argument("--misspell", default="data/misspell_map.json")
+    ap.add_argument("--onnx", default="models/distilbert-base-uncased.int8.onnx")
+    ap.add_argument("--max_length", type=int, default=64)
+    ap.add_argument("--objective", default="latency", choices=OBJECTIVES,
+                    help="'latency': p95 per utterance (edge nodes); 'throughput': batched utterances (batch boxes)")
+    ap.add_argument("--batch_size", type=int, default=16, help="utterances per batch (throughput objective)")
+    ap.add_argument("--limit", type=int, default=40, help="sample utterances used per trial")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--out", default=DEFAULT_PROFILE_PATH)
+    args = ap.parse_args()
+
+    # Candidate sets come from the rules once; only the ranker is re-created per trial
+    pp = PostProcessor(args.names, onnx_model_path=args.onnx, misspell_map_path=args.misspell,
+                       max_length=args.max_length, profile_path=None)
+    texts = [json.loads(line)["text"] for line in open(args.input, 'r', encoding='utf-8')][:args.limit or None]
+    cand_sets = [c for c in (pp._candidates(t) for t in texts) if len(c) > 1]
+    if not cand_sets:
+        raise SystemExit("no sample utterance has more than one candidate to rank")
+    make = lambda settings: PseudoLikelihoodRanker(onnx_path=args.onnx, max_length=args.max_length, tuning=settings)
+    result = tune(make, cand_sets, args.objective, args.repeat, args.batch_size)
+    profile = {
+        "host": host_info(),
+        "model": os.path.basename(args.onnx),
+        "objective": args.objective,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        **result,
+    }
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(profile, f, indent=1)
+    unit = "p95 ms/utt" if args.objective == "latency" else "ms/utt"
+    print(f"{result['default_cost']:.2f} -> {result['cost']:.2f} {unit}: {result['settings']} -> {args.out}")
@@ -0,0 +1,183 @@
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Tuple
+
+from .workqueue import WorkQueue, open_queue, new_token
+
+# Distributed batch job: a coordinator splits JSONL inputs into numbered chunks
+# under a job directory every host can reach, and queues the chunk ids; workers
+# on any number of hosts lease chunks, run the pipeline on them and write one
+# output file per chunk; the coordinator merges the outputs in input order.
+#
+#   <job_dir>/job.json              inputs, chunking and queue settings
+#   <job_dir>/chunks/<chunk>.jsonl  input rows of a chunk
+#   <job_dir>/out/<chunk>.jsonl     its {"id", "text"} outputs
+#
+# Chunk outputs are written whole (temp file + rename), so an existing output is
+# a complete one: a chunk handed out twice (expired lease, lost completion) is
+# processed at most once more and its output replaced by an identical one.
+# Every worker must run with the same pipeline options.
+
+JOB_FILE = "job.json"
+
+
+def chunk_name(i: int) -> str:
+    return f"{i:06d}"
+
+
+def _write_atomic(path: str, lines: List[str]):
+    tmp = f"{path}.{new_token()}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.writelines(lines)
+    os.replace(tmp, path)
+
+
+def create_job(job_dir: str, inputs: List[str], chunk_size: int = 500, queue_spec: str = None,
+               lease_s: float = 300, max_attempts: int = 3) -> Dict:
+    """
+    Split inputs into chunks of chunk_size rows and queue them (default queue:
+    files under <job_dir>/queue). Re-running it for an existing job only
+    re-queues chunk ids the queue does not know, so a coordinator can restart;
+    different inputs, chunk_size or queue_spec are a ValueError.
+    """
+    if chunk_size < 1:
+        raise ValueError(f"chunk_size must be >= 1, got {chunk_size}")
+    path = os.path.join(job_dir, JOB_FILE)
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            job = json.load(f)
+        if (job["inputs"], job["chunk_size"]) != (list(inputs), chunk_size):
+            raise ValueError(f"{job_dir} already holds a job over {job['inputs']} in chunks of {job['chunk_size']}")
+        if queue_spec and queue_spec != job["queue"]:
+            raise ValueError(f"{job_dir} already holds a job queued at {job['queue']!r}, not {queue_spec!r}")
+    else:
+        os.makedirs(os.path.join(job_dir, "chunks"), exist_ok=True)
+        os.makedirs(os.path.join(job_dir, "out"), exist_ok=True)
+        n, rows = 0, []
+        for inp in inputs:
+            with open(inp, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    rows.append(line if line.endswith("\n") else line + "\n")
+                    if len(rows) == chunk_size:
+                        _write_atomic(os.path.join(job_dir, "chunks", chunk_name(n) + ".jsonl"), rows)
+                        n, rows = n + 1, []
+        if rows:
+            _write_atomic(os.path.join(job_dir, "chunks", chunk_name(n) + ".jsonl"), rows)
+            n += 1
+        job = {
+            "inputs": list(inputs),
+            "chunk_size": chunk_size,
+            "chunks": n,
+            "queue": queue_spec or "fs:" + os.path.join(job_dir, "queue"),
+            "lease_s": lease_s,
+            "max_attempts": max_attempts,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        # job.json last: its presence means the chunks are all written
+        _write_atomic(path, [json.dumps(job, indent=1)])
+    open_job(job_dir)[1].put(chunk_name(i) for i in range(job["chunks"]))
+    return job
+
+
+def open_job(job_dir: str) -> Tuple[Dict, WorkQueue]:
+    path = os.path.join(job_dir, JOB_FILE)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"no batch job at {job_dir} (create one with run_pipeline.py --job coordinate)")
+    with open(path, 'r', encoding='utf-8') as f:
+        job = json.load(f)
+    return job, open_queue(job["queue"], lease_s=job["lease_s"], max_attempts=job["max_attempts"])
+
+
+def process_chunk(job_dir: str, chunk: str, process: Callable[[List[str]], List[str]]) -> bool:
+    """Write the chunk's output unless a complete one exists; True if it was processed"""
+    out_path = os.path.join(job_dir, "out", chunk + ".jsonl")
+    if os.path.exists(out_path):
+        return False
+    with open(os.path.join(job_dir, "chunks", chunk + ".jsonl"), 'r', encoding='utf-8') as f:
+        rows = [json.loads(line) for line in f]
+    preds = process([r["text"] for r in rows])
+    _write_atomic(out_path, [json.dumps({"id": r["id"], "text": p}, ensure_ascii=False) + "\n" for r, p in zip(rows, preds)])
+    return True
+
+
+def work(job_dir: str, process: Callable[[List[str]], List[str]], poll_s: float = 5.0, log: Callable = print) -> int:
+    """
+    Worker loop: lease chunks and process them until every chunk is done or
+    failed (waiting out other workers' leases, which may be abandoned). The
+    lease is renewed in the background while a chunk runs. Returns the number
+    of chunks this worker completed.
+    """
+    job, q = open_job(job_dir)
+    completed = 0
+    while True:
+        lease = q.lease()
+        if lease is None:
+            if q.finished():
+                return completed
+            time.sleep(poll_s)
+            continue
+        stop = threading.Event()
+
+        def heartbeat():
+            while not stop.wait(q.lease_s / 3):
+                if not q.renew(lease):
+                    log(f"chunk {lease.chunk}: lease lost, finishing it anyway")
+                    return
+
+        hb = threading.Thread(target=heartbeat, daemon=True)
+        hb.start()
+        t0 = time.perf_counter()
+        try:
+            ran = process_chunk(job_dir, lease.chunk, process)
+        except Exception as e:
+            log(f"chunk {lease.chunk}: attempt {lease.attempt}/{q.max_attempts} failed: {type(e).__name__}: {e}")
+            q.fail(lease, f"{type(e).__name__}: {e}")
+            continue
+        finally:
+            stop.set()
+            hb.join()
+        if q.complete(lease):
+            completed += 1
+        log(f"chunk {lease.chunk}: {'done' if ran else 'output already present'} "
+            f"in {time.perf_counter() - t0:.1f}s (attempt {lease.attempt})")
+
+
+def wait(job_dir: str, poll_s: float = 10.0, log: Callable = print) -> Dict[str, int]:
+    """
+    Block until every chunk is done or failed, logging progress; returns the
+    final counts. Abandoned leases are reaped here too, so chunks held by dead
+    workers go back to pending (or fail) even when no worker is left to lease.
+    """
+    job, q = open_job(job_dir)
+    last = None
+    while True:
+        q.reap()
+        counts = q.counts()
+        if counts != last:
+            log(f"job {job_dir}: " + ", ".join(f"{v} {k}" for k, v in counts.items()) + f" of {job['chunks']}")
+            last = counts
+        if q.finished():
+            return counts
+        time.sleep(poll_s)
+
+
+def merge(job_dir: str, output_path: str) -> int:
+    """Concatenate the chunk outputs in input order into output_path; returns the row count"""
+    job, q = open_job(job_dir)
+    counts = q.counts()
+    if counts["done"] != job["chunks"]:
+        errors = q.errors()
+        failed = {c: errors.get(c, "") for c in sorted(errors)
+                  if not os.path.exists(os.path.join(job_dir, "out", c + ".jsonl"))}
+        raise RuntimeError(f"cannot merge {job_dir}: {counts['done']} of {job['chunks']} chunks done; failed: {failed}")
+    lines = []
+    for i in range(job["chunks"]):
+        with open(os.path.join(job_dir, "out", chunk_name(i) + ".jsonl"), 'r', encoding='utf-8') as f:
+            lines.extend(f)
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    _write_atomic(output_path, lines)
+    return len(lines)
@@ -0,0 +1,184 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+
+
+def normalize_key(text: str) -> str:
+    """Cache key for an input utterance: NFC, whitespace collapsed"""
+    return ' '.join(unicodedata.normalize('NFC', text).split())
+
+
+def file_fingerprint(path: Optional[str]) -> str:
+    """Cheap identity of a file (size + mtime); empty for None/missing files"""
+    if not path or not os.path.exists(path):
+        return ''
+    st = os.stat(path)
+    return f"{os.path.abspath(path)}:{st.st_size}:{st.st_mtime_ns}"
+
+
+def fingerprint(parts: Iterable[str]) -> str:
+    h = hashlib.sha1()
+    for p in parts:
+        h.update(p.encode('utf-8'))
+        h.update(b'\0')
+    return h.hexdigest()
+
+
+class ResultCache:
+    """
+    Whole-utterance output cache.
+    - In-process LRU of max_entries with optional TTL (seconds)
+    - Optional SQLite store at `path` shared by every worker process on the host
+      (WAL mode; one connection per thread)
+    - Entries live under a fingerprint of everything that affects the output
+      (rules version, lexicon, misspelling map, model file, settings), so
+      workers with different configurations can share one store
+    - The store records when each fingerprint was last read or written; rows
+      of fingerprints idle for idle_s (left behind by edited inputs or retired
+      configurations) and rows past the TTL are purged on open and every
+      PURGE_EVERY puts
+    """
+
+    PURGE_EVERY = 1000
+    # A fingerprint's last-used time is written at most this often per process
+    TOUCH_EVERY_S = 60
+
+    def __init__(self, max_entries: int = 10000, ttl_s: float = None, path: str = None,
+                 idle_s: float = 7 * 86400):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.path = path
+        self.idle_s = idle_s
+        self._mem = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.hits_mem = 0
+        self.hits_disk = 0
+        self.misses = 0
+        self._touched = {}
+        self._puts = 0
+        if path:
+            db = self._db()
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                " fingerprint TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, created REAL NOT NULL,"
+                " PRIMARY KEY (fingerprint, key))"
+            )
+            db.execute("CREATE TABLE IF NOT EXISTS fingerprints (fingerprint TEXT PRIMARY KEY, last_used REAL NOT NULL)")
+            self.purge()
+
+    def _db(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _expired(self, created: float, now: float) -> bool:
+        return self.ttl_s is not None and now - created > self.ttl_s
+
+    def get(self, fp: str, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            hit = self._mem.get((fp, key))
+            if hit is not None:
+                value, created = hit
+                if not self._expired(created, now):
+                    self._mem.move_to_end((fp, key))
+                    self.hits_mem += 1
+                    return value
+                del self._mem[(fp, key)]
+        if self.path:
+            self._touch(fp, now)
+            row = self._db().execute(
+                "SELECT value, created FROM results WHERE fingerprint = ? AND key = ?", (fp, key)
+            ).fetchone()
+            if row is not None and not self._expired(row[1], now):
+                self._remember(fp, key, row[0], row[1])
+                with self._lock:
+                    self.hits_disk += 1
+                return row[0]
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, fp: str, key: str, value: str):
+        now = time.time()
+        self._remember(fp, key, value, now)
+        if self.path:
+            self._touch(fp, now)
+            with self._lock:
+                self._puts += 1
+                purge = self._puts % self.PURGE_EVERY == 0
+            if purge:
+                self.purge()
+            self._db().execute(
+                "INSERT OR REPLACE INTO results (fingerprint, key, value, created) VALUES (?, ?, ?, ?)",
+                (fp, key, value, now),
+            )
+
+    def _touch(self, fp: str, now: float):
+        """Mark fp as in use in the shared store (throttled to TOUCH_EVERY_S)"""
+        with self._lock:
+            if now - self._touched.get(fp, 0.0) < self.TOUCH_EVERY_S:
+                return
+            self._touched[fp] = now
+        self._db().execute("INSERT OR REPLACE INTO fingerprints (fingerprint, last_used) VALUES (?, ?)", (fp, now))
+
+    def _remember(self, fp: str, key: str, value: str, created: float):
+        with self._lock:
+            self._mem[(fp, key)] = (value, created)
+            self._mem.move_to_end((fp, key))
+            while len(self._mem) > self.max_entries:
+                self._mem.popitem(last=False)
+
+    def purge(self):
+        """Drop expired rows, and the rows of fingerprints idle for idle_s, from the shared store"""
+        if not self.path:
+            return
+        now = time.time()
+        db = self._db()
+        if self.ttl_s is not None:
+            db.execute("DELETE FROM results WHERE created < ?", (now - self.ttl_s,))
+        idle = now - self.idle_s
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            # Rows with no fingerprint record predate it; they go once they are idle_s old
+            db.execute(
+                "DELETE FROM results WHERE fingerprint IN (SELECT fingerprint FROM fingerprints WHERE last_used < ?)"
+                " OR (created < ? AND fingerprint NOT IN (SELECT fingerprint FROM fingerprints))",
+                (idle, idle),
+            )
+            db.execute("DELETE FROM fingerprints WHERE last_used < ?", (idle,))
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def clear(self):
+        with self._lock:
+            self._mem.clear()
+        if self.path:
+            self._db().execute("DELETE FROM results")
+            self._db().execute("DELETE FROM fingerprints")
+            with self._lock:
+                self._touched.clear()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits_mem + self.hits_disk + self.misses
+            return {
+                "lookups": lookups,
+                "hits_mem": self.hits_mem,
+                "hits_disk": self.hits_disk,
+                "misses": self.misses,
+                "hit_rate": (self.hits_mem + self.hits_disk) / lookups if lookups else 0.0,
+                "entries_mem": len(self._mem),
+            }
@@ -0,0 +1,71 @@
+import itertools
+import os
+import subprocess
+import sys
+import threading
+from typing import List, Sequence
+
+from .framing import read_frame, write_frame, check_codec
+
+WORKER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "worker.py")
+
+
+class WorkerClient:
+    """
+    Client for a long-lived worker.py process speaking length-prefixed frames.
+    - process(text): one request, waits for its response
+    - process_many(texts): streams every request while reading responses, so the
+      worker can micro-batch them; results come back in input order
+    Extra worker options go in `args`, e.g. ["--onnx", path, "--batch_size", "16"].
+    """
+
+    def __init__(self, args: Sequence[str] = (), codec: str = "json", worker: str = WORKER, python: str = sys.executable):
+        check_codec(codec)
+        self.codec = codec
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self.proc = subprocess.Popen([python, worker, "--codec", codec, *args],
+                                     stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+    def _read(self):
+        resp = read_frame(self.proc.stdout, self.codec)
+        if resp is None:
+            raise RuntimeError(f"worker exited (code {self.proc.poll()})")
+        return resp
+
+    def process(self, text: str) -> str:
+        return self.process_many([text])[0]
+
+    def process_many(self, texts: List[str]) -> List[str]:
+        with self._lock:
+            ids = [next(self._ids) for _ in texts]
+
+            def send():
+                for i, t in zip(ids, texts):
+                    write_frame(self.proc.stdin, {"id": i, "text": t}, self.codec)
+
+            writer = threading.Thread(target=send, daemon=True)
+            writer.start()
+            # Read every response before raising, so no stale frame is left for the next call
+            out, errors = {}, []
+            for _ in texts:
+                resp = self._read()
+                if "error" in resp:
+                    errors.append(f"request {resp.get('id')}: {resp['error']}")
+                else:
+                    out[resp["id"]] = resp["text"]
+            writer.join()
+        if errors:
+            raise RuntimeError(f"worker error for {len(errors)} of {len(texts)} requests: " + "; ".join(errors))
+        return [out[i] for i in ids]
+
+    def close(self):
+        if self.proc.poll() is None:
+            self.proc.stdin.close()
+            self.proc.wait()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
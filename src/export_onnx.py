@@ -3,11 +3,16 @@ import torch
 from transformers import AutoTokenizer, AutoModelForMaskedLM
 import onnx
 from onnxruntime.quantization import quantize_dynamic, QuantType
+from .shared_weights import externalize
+from .ranker_onnx import layer_tier_path, truncate_layers
 
-def export(model_name: str, max_length: int, out_path: str):
+def export(model_name: str, max_length: int, out_path: str, layers: int = None):
     tok = AutoTokenizer.from_pretrained(model_name)
     mdl = AutoModelForMaskedLM.from_pretrained(model_name)
     mdl.eval()
+    if layers:
+        # Shallow ranking tier: first `layers` transformer blocks, same vocab projector
+        truncate_layers(mdl, layers)
     # Dummy inputs
     sample = tok("hello world", return_tensors="pt", truncation=True, max_length=max_length)
     with torch.no_grad():
@@ -36,9 +41,17 @@ if __name__ == "__main__":
     ap.add_argument("--max_length", type=int, default=64)
     ap.add_argument("--out", default="models/distilbert-base-uncased.onnx")
     ap.add_argument("--quant_out", default="models/distilbert-base-uncased.int8.onnx")
+    ap.add_argument("--layers", type=int, default=None,
+                    help="keep only the first N transformer layers; writes the .L<N> ranking tier next to --out / --quant_out")
+    ap.add_argument("--external_data", action="store_true",
+                    help="keep the quantized weights in a page-aligned <quant_out>.data file (needed for share_weights)")
     args = ap.parse_args()
+    if args.layers:
+        args.out, args.quant_out = layer_tier_path(args.out, args.layers), layer_tier_path(args.quant_out, args.layers)
 
-    export(args.model, args.max_length, args.out)
+    export(args.model, args.max_length, args.out, args.layers)
     quantize(args.out, args.quant_out)
+    if args.external_data:
+        externalize(args.quant_out, args.quant_out)
     print("Exported:", args.out)
     print("Quantized:", args.quant_out)
@@ -0,0 +1,72 @@
+import json
+import struct
+from typing import Any, BinaryIO, Optional
+
+try:
+    import msgpack  # type: ignore
+except Exception:
+    msgpack = None
+
+# Every frame is a 4-byte big-endian payload length followed by the payload
+HEADER = struct.Struct('>I')
+MAX_FRAME = 16 * 1024 * 1024
+CODECS = ('json', 'msgpack')
+
+
+class FrameDecodeError(ValueError):
+    """A whole frame was read but its payload does not decode; the stream is still in sync"""
+
+
+def check_codec(codec: str):
+    if codec not in CODECS:
+        raise ValueError(f"codec must be one of {CODECS}, got {codec!r}")
+    if codec == 'msgpack' and msgpack is None:
+        raise RuntimeError("msgpack is not installed; use codec='json'")
+
+
+def encode(obj: Any, codec: str = 'json') -> bytes:
+    if codec == 'msgpack':
+        payload = msgpack.packb(obj, use_bin_type=True)
+    else:
+        payload = json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return HEADER.pack(len(payload)) + payload
+
+
+def write_frame(stream: BinaryIO, obj: Any, codec: str = 'json'):
+    stream.write(encode(obj, codec))
+    stream.flush()
+
+
+def _read_exact(stream: BinaryIO, n: int) -> Optional[bytes]:
+    buf = b''
+    while len(buf) < n:
+        chunk = stream.read(n - len(buf))
+        if not chunk:
+            if buf:
+                raise EOFError(f"stream ended inside a frame ({len(buf)}/{n} bytes)")
+            return None
+        buf += chunk
+    return buf
+
+
+def read_frame(stream: BinaryIO, codec: str = 'json') -> Optional[Any]:
+    """
+    Next decoded frame, or None at a clean end of stream. A truncated or oversize
+    frame raises EOFError / ValueError (the stream is lost); a payload that does
+    not decode raises FrameDecodeError, and the next frame can still be read.
+    """
+    head = _read_exact(stream, HEADER.size)
+    if head is None:
+        return None
+    (n,) = HEADER.unpack(head)
+    if n > MAX_FRAME:
+        raise ValueError(f"frame of {n} bytes exceeds MAX_FRAME ({MAX_FRAME})")
+    payload = _read_exact(stream, n) if n else b''
+    if payload is None:
+        raise EOFError("stream ended after a frame header")
+    try:
+        if codec == 'msgpack':
+            return msgpack.unpackb(payload, raw=False)
+        return json.loads(payload.decode('utf-8'))
+    except Exception as e:
+        raise FrameDecodeError(f"undecodable {codec} frame of {n} bytes: {type(e).__name__}: {e}") from e
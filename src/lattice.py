@@ -0,0 +1,139 @@
+import time
+from typing import List, Optional, Tuple
+
+PUNCT_GLUE = '.,!?'
+
+
+class Segment:
+    """
+    One slot of the candidate lattice.
+    - alts: alternative surface forms; alts[0] is the rule pipeline's default
+    - kind: 'fixed', or which stage disagreed ('email', 'number', 'name', 'comma')
+    """
+    __slots__ = ('alts', 'kind')
+
+    def __init__(self, alts: List[str], kind: str = 'fixed'):
+        self.alts = alts
+        self.kind = kind
+
+    def __repr__(self):
+        return f"Segment({self.alts!r}, {self.kind!r})"
+
+
+class Lattice:
+    """
+    Sequence of segments; a choice picks one alternative per segment.
+    Rendering joins the picks with spaces, glues leading punctuation to the
+    previous word and ends the sentence with a period (as add_punctuation does).
+    """
+    __slots__ = ('segments', 'source')
+
+    def __init__(self, segments: List[Segment], source: str = ''):
+        self.segments = segments
+        self.source = source
+
+    def uncertain(self) -> List[int]:
+        return [i for i, seg in enumerate(self.segments) if len(seg.alts) > 1]
+
+    def size(self) -> int:
+        """Number of distinct sentences the lattice encodes."""
+        n = 1
+        for seg in self.segments:
+            n *= len(seg.alts)
+        return n
+
+    def render(self, choice: List[int]) -> Tuple[str, List[Tuple[int, int]]]:
+        """Return the sentence for `choice` and each segment's (start, end) char span in it."""
+        parts = []
+        pos = 0
+        offsets = []
+        for seg, a in zip(self.segments, choice):
+            alt = seg.alts[a]
+            if not alt:
+                offsets.append((pos, pos))
+                continue
+            if parts and alt[0] not in PUNCT_GLUE:
+                parts.append(' ')
+                pos += 1
+            parts.append(alt)
+            offsets.append((pos, pos + len(alt)))
+            pos += len(alt)
+        text = ''.join(parts)
+        if text and text[-1] not in '.!?':
+            text += '.'
+        elif not text and self.source:
+            text = '.'
+        return text, offsets
+
+    def default(self) -> str:
+        return self.render([0] * len(self.segments))[0]
+
+
+def _context_span(offsets: List[Tuple[int, int]], k: int) -> Tuple[int, int]:
+    # The changed span plus its nearest non-empty neighbour on each side, so that
+    # alternatives of different lengths (e.g. ',' vs '') are still compared in context
+    start, end = offsets[k]
+    for j in range(k - 1, -1, -1):
+        if offsets[j][1] > offsets[j][0]:
+            start = offsets[j][0]
+            break
+    for j in range(k + 1, len(offsets)):
+        if offsets[j][1] > offsets[j][0]:
+            end = offsets[j][1]
+            break
+    return start, end
+
+
+def beam_search(lattice: Lattice, ranker, beam_width: int = 8, budget_ms: Optional[float] = None) -> str:
+    """
+    Pick the best path through `lattice` with a left-to-right beam search.
+    Each step re-scores only the span being decided (plus one word of context on
+    each side) with ranker.score_spans; undecided spans keep their default. When
+    `budget_ms` is set, the beam is narrowed from the ranker's measured cost per
+    masked row so the whole search fits the budget, and falls back to the
+    defaults once the budget is spent.
+    """
+    spans = lattice.uncertain()
+    n = len(lattice.segments)
+    if not spans:
+        return lattice.default()
+
+    t0 = time.perf_counter()
+    beam = [(0.0, [0] * n)]
+    for step, k in enumerate(spans):
+        width = beam_width
+        if budget_ms is not None:
+            left = budget_ms - (time.perf_counter() - t0) * 1000
+            if left <= 0:
+                break
+            width = _budget_width(lattice, spans[step:], ranker, left, beam_width)
+
+        items = []
+        paths = []
+        for score, choice in beam:
+            for a in range(len(lattice.segments[k].alts)):
+                c = list(choice)
+                c[k] = a
+                text, offsets = lattice.render(c)
+                s, e = _context_span(offsets, k)
+                items.append((text, s, e))
+                paths.append((score, c))
+        scores = ranker.score_spans(items)
+        scored = [(base + s, c) for (base, c), s in zip(paths, scores)]
+        scored.sort(key=lambda x: -x[0])
+        beam = scored[:max(1, width)]
+    return lattice.render(beam[0][1])[0]
+
+
+def _budget_width(lattice: Lattice, spans: List[int], ranker, left_ms: float, max_width: int) -> int:
+    ms_per_row = getattr(ranker, 'ms_per_row', None)
+    if not ms_per_row:
+        return max_width
+    # ~1.5 wordpieces per word, and each scored span carries one word of context per side
+    rows = 0.0
+    for k in spans:
+        for alt in lattice.segments[k].alts:
+            rows += 1.5 * (len(alt.split()) + 2)
+    if rows == 0:
+        return max_width
+    return max(1, min(max_width, int(left_ms / (rows * ms_per_row))))
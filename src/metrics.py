@@ -56,14 +56,10 @@ def compute_entity_metrics(pred: str, gold: str, names_lex: List[str]) -> Dict[s
         "name_f1": f1
     }
 
-def eval_corpus(pred_path: str, gold_path: str, names_lex_path: str) -> Dict[str,float]:
-    names_lex = [x.strip() for x in open(names_lex_path, 'r', encoding='utf-8').read().splitlines() if x.strip()]
-    preds = [json.loads(line) for line in open(pred_path, 'r', encoding='utf-8')]
-    golds = [json.loads(line) for line in open(gold_path, 'r', encoding='utf-8')]
+def eval_predictions(preds: List[str], golds: List[str], names_lex: List[str]) -> Dict[str,float]:
     assert len(preds) == len(golds), "Pred and gold must have same length/order"
     WERs, CERs, PUNCS, EAs, NAs, NMF1 = [], [], [], [], [], []
-    for p, g in zip(preds, golds):
-        pt, gt = p["text"], g["text"]
+    for pt, gt in zip(preds, golds):
         WERs.append(wer(gt, pt))
         CERs.append(cer(gt, pt))
         PUNCS.append(punctuation_f1(pt, gt)["f1"])
@@ -77,3 +73,13 @@ def eval_corpus(pred_path: str, gold_path: str, names_lex_path: str) -> Dict[str
         "NumberAcc": float(np.mean(NAs)),
         "NameF1": float(np.mean(NMF1))
     }
+
+def load_names(names_lex_path: str) -> List[str]:
+    return [x.strip() for x in open(names_lex_path, 'r', encoding='utf-8').read().splitlines() if x.strip()]
+
+def eval_corpus(pred_path: str, gold_path: str, names_lex_path: str) -> Dict[str,float]:
+    names_lex = load_names(names_lex_path)
+    preds = [json.loads(line) for line in open(pred_path, 'r', encoding='utf-8')]
+    golds = [json.loads(line) for line in open(gold_path, 'r', encoding='utf-8')]
+    assert len(preds) == len(golds), "Pred and gold must have same length/order"
+    return eval_predictions([p["text"] for p in preds], [g["text"] for g in golds], names_lex)
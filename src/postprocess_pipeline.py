@@ -1,16 +1,142 @@
-import json, time
+import json, queue, threading, time
+import numpy as np
 from typing import Dict, List
-from .rules import generate_candidates
+from .rules import generate_candidates, build_lattice, BUILTIN_REPLACEMENTS, RULES_VERSION
 from .ranker_onnx import PseudoLikelihoodRanker
+from .replacer import MisspellReplacer
+from .lattice import beam_search
+from .cache import ResultCache, normalize_key, file_fingerprint, fingerprint
+from .prerank import PreRanker, UnigramTable, PRERANK_VERSION
+from .punct_tagger import PunctTagger, strip_punctuation
+from .autotune import load_profile, DEFAULT_PROFILE_PATH
+
+SEARCH_MODES = ('candidates', 'lattice')
+# 'rules': the candidates' rule punctuation plus the final heuristic; 'tagger': src/punct_tagger.py
+PUNCTUATION_MODES = ('rules', 'tagger')
 
 class PostProcessor:
-    def __init__(self, names_lex_path: str, onnx_model_path: str = None, device: str = "cpu", max_length: int = 64):
+    """
+    Rules + ranker post-processor.
+    With inference_threads=N a single instance can be shared by many threads:
+    process_one keeps no per-call state on the instance, rules and tokenization
+    run on the calling thread, and the ranker funnels model calls through its
+    N-worker pool over one shared InferenceSession (see PseudoLikelihoodRanker).
+    With cache_size > 0, outputs are cached per whitespace/NFC-normalized input
+    (LRU, optional TTL); cache_path adds a SQLite store shared by all workers
+    on the host. Changing the lexicon, RULES_VERSION, the misspelling map, the
+    model file or any output-affecting setting changes the cache fingerprint,
+    so stale results are never served.
+    With prerank=True (candidates search) a cheap pre-ranker (src/prerank.py)
+    drops dominated candidates before the MLM; unigram_path adds its unigram feature.
+    ranker_layers=N ranks with the N-layer DistilBERT tier instead of the full
+    model (see PseudoLikelihoodRanker). No tier has been measured against the
+    full model yet (evaluate.py --compare_layers), so it stays opt-in.
+    With punctuation='tagger', punctuation and casing come from the token
+    tagger at tagger_path instead: candidates are compared without their
+    punctuation (so variants that differ only there collapse before the MLM)
+    and the chosen text is re-punctuated in one tagger run.
+    The ONNX ranker takes its host-specific settings (threads, execution mode,
+    graph optimizations, batching) from the tuned profile at profile_path
+    (python -m src.autotune) when one exists for this host and model;
+    profile_path=None uses the defaults.
+    """
+    def __init__(self, names_lex_path: str, onnx_model_path: str = None, device: str = "cpu", max_length: int = 64, misspell_map_path: str = None,
+                 search: str = "candidates", beam_width: int = 8, latency_budget_ms: float = None,
+                 pll_k: int = None, pll_strategy: str = "stride", windowed: bool = False,
+                 inference_threads: int = None, cache_size: int = 0, cache_ttl_s: float = None, cache_path: str = None,
+                 share_weights: bool = False,
+                 prerank: bool = False, unigram_path: str = None, ranker_layers: int = None,
+                 punctuation: str = "rules", tagger_path: str = None, profile_path: str = DEFAULT_PROFILE_PATH):
+        if search not in SEARCH_MODES:
+            raise ValueError(f"search must be one of {SEARCH_MODES}, got {search!r}")
+        if punctuation not in PUNCTUATION_MODES:
+            raise ValueError(f"punctuation must be one of {PUNCTUATION_MODES}, got {punctuation!r}")
+        if punctuation == 'tagger' and not tagger_path:
+            raise ValueError("punctuation='tagger' needs tagger_path (python -m src.punct_tagger)")
+        # 'candidates': rank <=3 whole sentences; 'lattice': beam search over per-span alternatives
+        self.search = search
+        self.beam_width = beam_width
+        self.latency_budget_ms = latency_budget_ms
         self.names_lex = [x.strip() for x in open(names_lex_path, 'r', encoding='utf-8').read().splitlines() if x.strip()]
-        self.ranker = PseudoLikelihoodRanker(onnx_path=onnx_model_path, device=device, max_length=max_length)
+        # Built-in rule tables + misspelling map in one automaton; self.replacer.reload_if_changed()
+        # (called by worker.py before each batch) or reload() picks up map edits
+        self.replacer = MisspellReplacer(misspell_map_path, BUILTIN_REPLACEMENTS)
+        self.profile = load_profile(profile_path, onnx_model_path) if onnx_model_path else {}
+        self.ranker = PseudoLikelihoodRanker(onnx_path=onnx_model_path, device=device, max_length=max_length,
+                                             pll_k=pll_k, pll_strategy=pll_strategy, windowed=windowed,
+                                             inference_threads=inference_threads, share_weights=share_weights,
+                                             layers=ranker_layers, tuning=self.profile)
+        self.tagger = PunctTagger(tagger_path, self.names_lex) if punctuation == 'tagger' else None
+        self.preranker = None
+        if prerank:
+            self.preranker = PreRanker(self.names_lex, UnigramTable.load(unigram_path) if unigram_path else None)
+        self.cache = None
+        if cache_size > 0 or cache_path:
+            self.cache = ResultCache(max_entries=max(cache_size, 1), ttl_s=cache_ttl_s, path=cache_path)
+        model_path = self.ranker.onnx_path
+        model_files = [model_path, model_path + '.data'] if model_path else []
+        self._config_fp = fingerprint([
+            RULES_VERSION,
+            fingerprint(self.names_lex),
+            *[file_fingerprint(f) for f in model_files],
+            f"{PRERANK_VERSION}:{file_fingerprint(unigram_path)}" if prerank else '',
+            file_fingerprint(tagger_path) if self.tagger is not None else '',
+            self.ranker.model_name,
+            repr((search, beam_width, latency_budget_ms, max_length, pll_k, pll_strategy, windowed, prerank, ranker_layers, punctuation)),
+            repr(sorted(self.profile.items())),
+        ])
+        self._fp = (None, None)
+
+    def _fingerprint(self) -> str:
+        # Recomputed only when the misspelling map was reloaded
+        version, fp = self._fp
+        if version != self.replacer.version:
+            version = self.replacer.version
+            fp = fingerprint([self._config_fp, version])
+            self._fp = (version, fp)
+        return fp
+
+    def cache_stats(self) -> Dict[str, float]:
+        return self.cache.stats() if self.cache is not None else {}
+
+    def _remaining_ms(self, t0: float):
+        if self.latency_budget_ms is None:
+            return None
+        return self.latency_budget_ms - (time.perf_counter() - t0) * 1000
 
     def process_one(self, text: str) -> str:
-        cands = generate_candidates(text, self.names_lex)
-        best = self.ranker.choose_best(cands)
+        if self.cache is None:
+            return self._process(text)
+        # Equivalent inputs share one entry, so process the normalized form itself
+        key = normalize_key(text)
+        fp = self._fingerprint()
+        best = self.cache.get(fp, key)
+        if best is None:
+            best = self._process(key)
+            self.cache.put(fp, key, best)
+        return best
+
+    def _process(self, text: str) -> str:
+        t0 = time.perf_counter()
+        if self.search == 'lattice':
+            lattice = build_lattice(text, self.names_lex, self.replacer)
+            best = beam_search(lattice, self.ranker, self.beam_width, self._remaining_ms(t0))
+        else:
+            best = self.ranker.choose_best(self._candidates(text), budget_ms=self._remaining_ms(t0))
+        return self._finish(best)
+
+    def _candidates(self, text: str) -> List[str]:
+        cands = generate_candidates(text, self.names_lex, self.replacer)
+        if self.tagger is not None:
+            # The tagger decides punctuation, so only the words are left to rank
+            cands = list(dict.fromkeys(strip_punctuation(c) for c in cands))
+        if self.preranker is not None:
+            cands = self.preranker.prune(cands)
+        return cands
+
+    def _finish(self, best: str) -> str:
+        if self.tagger is not None:
+            return self.tagger.punctuate(best)
         # Simple punctuation heuristic: ensure trailing period for statements; add '?' if leading "can/shall/will/could"
         lower = best.lower().strip()
         if lower.endswith(('?', '.', ',')) is False:
@@ -20,13 +146,182 @@ class PostProcessor:
                 best = best.rstrip() + '.'
         return best
 
-def run_file(input_path: str, output_path: str, names_lex_path: str, onnx_model_path: str = None, device: str = "cpu", max_length: int = 64):
-    pp = PostProcessor(names_lex_path, onnx_model_path=onnx_model_path, device=device, max_length=max_length)
+    def process_batch(self, texts: List[str]) -> List[str]:
+        """
+        Process several utterances at once. In candidates search with exact PLL and
+        no latency budget, the candidates of every utterance are scored together in
+        the ranker's batched forward passes; otherwise this is process_one per text.
+        """
+        if self.search != 'candidates' or self.ranker.pll_k is not None or self.latency_budget_ms is not None:
+            return [self.process_one(t) for t in texts]
+        out = [None] * len(texts)
+        todo = []
+        fp = self._fingerprint() if self.cache is not None else None
+        for i, text in enumerate(texts):
+            if self.cache is None:
+                todo.append((i, text))
+                continue
+            key = normalize_key(text)
+            out[i] = self.cache.get(fp, key)
+            if out[i] is None:
+                todo.append((i, key))
+
+        cand_lists = [self._candidates(text) for _, text in todo]
+        flat = [c for cands in cand_lists if len(cands) > 1 for c in cands]
+        scores = iter(self.ranker.score_full(flat) if flat else [])
+        for (i, text), cands in zip(todo, cand_lists):
+            best = cands[0]
+            if len(cands) > 1:
+                sc = [next(scores) for _ in cands]
+                best = cands[int(np.argmax(sc))]
+            out[i] = self._finish(best)
+            if self.cache is not None:
+                self.cache.put(fp, text, out[i])
+        return out
+
+    def _prepare(self, text: str):
+        """Pipeline stage 1 (CPU): candidates / lattice and, if scored in batched rows, the ranker's tokenized rows"""
+        t0 = time.perf_counter()
+        if self.search == 'lattice':
+            lattice = build_lattice(text, self.names_lex, self.replacer)
+            return ('lattice', lattice, (time.perf_counter() - t0) * 1000)
+        cands = self._candidates(text)
+        if len(cands) == 1:
+            return ('done', cands[0])
+        if self.latency_budget_ms is not None or not self.ranker.rows_batched:
+            # Ranked at scoring time exactly as process_one does: a budget is spent
+            # there, and per-row exact PLL has no batch to prepare
+            return ('rank', cands, (time.perf_counter() - t0) * 1000)
+        return ('rows', cands, self.ranker.prepare(cands, self.ranker.pll_k))
+
+    def _infer(self, job) -> str:
+        """Pipeline stage 2 (model): rank a stage-1 job and finish the winner"""
+        kind = job[0]
+        if kind == 'done':
+            return self._finish(job[1])
+        if kind == 'rows':
+            scores = self.ranker.score_prepared(job[2])
+            return self._finish(job[1][int(np.argmax(scores))])
+        # As in _process, the budget also pays for stage 1 (queue wait excluded)
+        budget = None if self.latency_budget_ms is None else self.latency_budget_ms - job[2]
+        if kind == 'lattice':
+            best = beam_search(job[1], self.ranker, self.beam_width, budget)
+        else:
+            best = self.ranker.choose_best(job[1], budget_ms=budget)
+        return self._finish(best)
+
+    def process_pipelined(self, texts: List[str], depth: int = 8):
+        """
+        process_one over texts with the two halves overlapped: the calling thread
+        runs the rules and tokenization (_prepare) for utterance i+1 while an
+        inference thread scores utterance i (ORT releases the GIL). A queue of at
+        most `depth` prepared jobs connects them; outputs keep input order.
+        Returns (outputs, stats): each stage's busy share of the wall time, and
+        how long the producer was blocked on a full queue / the consumer starved
+        on an empty one.
+        Scoring matches process_one (batched rows only where the ranker would
+        batch anyway), and a latency budget covers stage 1 plus scoring but not
+        the time a job waits in the queue.
+        """
+        if depth < 1:
+            raise ValueError(f"depth must be >= 1, got {depth}")
+        q = queue.Queue(maxsize=depth)
+        out = [None] * len(texts)
+        busy = {'prepare': 0.0, 'infer': 0.0, 'blocked': 0.0, 'starved': 0.0}
+        failed = []
+        fp = self._fingerprint() if self.cache is not None else None
+
+        def consume():
+            try:
+                while True:
+                    t0 = time.perf_counter()
+                    item = q.get()
+                    t1 = time.perf_counter()
+                    busy['starved'] += t1 - t0
+                    if item is None:
+                        return
+                    i, key, job = item
+                    if job is not None:
+                        out[i] = self._infer(job)
+                        if self.cache is not None:
+                            self.cache.put(fp, key, out[i])
+                    busy['infer'] += time.perf_counter() - t1
+            except BaseException as e:
+                failed.append(e)
+                # Unblock the producer; it stops at its next put
+                while True:
+                    try:
+                        q.get_nowait()
+                    except queue.Empty:
+                        break
+
+        worker = threading.Thread(target=consume, name="pipeline-infer", daemon=True)
+        t_start = time.perf_counter()
+        worker.start()
+        try:
+            for i, text in enumerate(texts):
+                if failed:
+                    break
+                t0 = time.perf_counter()
+                key, job = text, None
+                if self.cache is not None:
+                    key = normalize_key(text)
+                    out[i] = self.cache.get(fp, key)
+                if out[i] is None:
+                    job = self._prepare(key)
+                t1 = time.perf_counter()
+                busy['prepare'] += t1 - t0
+                while not failed:
+                    try:
+                        q.put((i, key, job), timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+                busy['blocked'] += time.perf_counter() - t1
+        finally:
+            while worker.is_alive():
+                try:
+                    q.put(None, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+            worker.join()
+        if failed:
+            raise failed[0]
+        wall = time.perf_counter() - t_start
+        stats = {f"{k}_util": v / wall if wall else 0.0 for k, v in busy.items()}
+        stats["wall_s"] = wall
+        return out, stats
+
+def run_file(input_path: str, output_path: str, names_lex_path: str, onnx_model_path: str = None, device: str = "cpu", max_length: int = 64, misspell_map_path: str = None,
+             search: str = "candidates", beam_width: int = 8, latency_budget_ms: float = None,
+             pll_k: int = None, pll_strategy: str = "stride", windowed: bool = False,
+             cache_size: int = 0, cache_ttl_s: float = None, cache_path: str = None, share_weights: bool = False,
+             prerank: bool = False, unigram_path: str = None, ranker_layers: int = None,
+             punctuation: str = "rules", tagger_path: str = None, pipeline_depth: int = 0,
+             profile_path: str = DEFAULT_PROFILE_PATH):
+    """
+    Process a JSONL file of {"id", "text"} rows. pipeline_depth > 0 overlaps the
+    rules and inference stages (PostProcessor.process_pipelined) and adds their
+    utilization to the returned stats; otherwise the stats are the cache's.
+    Both modes pick the same candidates; with a latency budget the pipelined
+    one can differ where timing does, as its budget excludes queue wait.
+    """
+    pp = PostProcessor(names_lex_path, onnx_model_path=onnx_model_path, device=device, max_length=max_length, misspell_map_path=misspell_map_path,
+                       search=search, beam_width=beam_width, latency_budget_ms=latency_budget_ms,
+                       pll_k=pll_k, pll_strategy=pll_strategy, windowed=windowed,
+                       cache_size=cache_size, cache_ttl_s=cache_ttl_s, cache_path=cache_path,
+                       share_weights=share_weights,
+                       prerank=prerank, unigram_path=unigram_path, ranker_layers=ranker_layers,
+                       punctuation=punctuation, tagger_path=tagger_path, profile_path=profile_path)
     rows = [json.loads(line) for line in open(input_path, 'r', encoding='utf-8')]
-    out = []
-    for r in rows:
-        pred = pp.process_one(r["text"])
-        out.append({"id": r["id"], "text": pred})
+    stats = {}
+    if pipeline_depth > 0:
+        preds, stats = pp.process_pipelined([r["text"] for r in rows], pipeline_depth)
+    else:
+        preds = [pp.process_one(r["text"]) for r in rows]
+    out = [{"id": r["id"], "text": pred} for r, pred in zip(rows, preds)]
     with open(output_path, 'w', encoding='utf-8') as f:
         for o in out:
             f.write(json.dumps(o, ensure_ascii=False) + "\n")
+    return {**pp.cache_stats(), **stats}
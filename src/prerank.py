@@ -0,0 +1,187 @@
+import json
+import math
+import re
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .rules import NUM_WORD, NUM_PREFIX, indian_group
+from .utils import EMAIL_RE
+
+# Spoken-email leftovers the rules should have rewritten ("at gmail", "dot com", "gmailcom")
+SPOKEN_EMAIL_RE = re.compile(
+    r'\b(?:at|dot)\s+(?:g\s?mail|yahoo|outlook|hotmail|com|org|net)\b'
+    r'|\b\w*(?:mail|yahoo|outlook)(?:com|org|net)\b',
+    re.IGNORECASE,
+)
+# Rupee amounts, written with the symbol or still as a spoken 'rs'/'rupees' word
+AMOUNT_RE = re.compile(r'(₹|\b(?:rs|rupees)\s+)([0-9][0-9,]*)', re.IGNORECASE)
+WORD_RE = re.compile(r"[a-z']+")
+STRIP = '.,?!'
+
+PRERANK_FEATURES = ('entities', 'amounts', 'lexicon', 'unigram')
+# Bumped when pruning changes which candidates survive (part of the result-cache fingerprint)
+PRERANK_VERSION = 3
+
+
+def entity_defects(s: str) -> int:
+    """
+    Count ill-formed entities: '@' tokens that are not a full EMAIL_RE match,
+    spoken-email leftovers, and runs of 2+ number words (or double/triple + digit word)
+    """
+    n = len(SPOKEN_EMAIL_RE.findall(s))
+    run = 0
+    for tok in s.split():
+        t = tok.strip(STRIP)
+        if '@' in t and not EMAIL_RE.fullmatch(t.lower()):
+            n += 1
+        low = t.lower()
+        if low in NUM_WORD or low in NUM_PREFIX:
+            run += 1
+            continue
+        n += run >= 2
+        run = 0
+    return n + (run >= 2)
+
+
+def amount_defects(s: str) -> int:
+    """Count rupee amounts not written as '₹' + Indian digit grouping ('rs 1500', '₹149800')"""
+    n = 0
+    for m in AMOUNT_RE.finditer(s):
+        digits = m.group(2).rstrip(',')
+        n += m.group(1) != '₹' or digits != indian_group(digits)
+    return n
+
+
+class UnigramTable:
+    """Add-one smoothed unigram log-probabilities over lowercased words"""
+
+    def __init__(self, counts: Dict[str, int]):
+        self.counts = counts
+        self.total = sum(counts.values()) + len(counts) + 1
+
+    @classmethod
+    def load(cls, path: str) -> 'UnigramTable':
+        with open(path, 'r', encoding='utf-8') as f:
+            counts = json.load(f)
+        if not isinstance(counts, dict):
+            raise ValueError(f"{path}: expected a JSON object of word -> count")
+        return cls({str(k): int(v) for k, v in counts.items()})
+
+    @classmethod
+    def build(cls, texts: Iterable[str]) -> 'UnigramTable':
+        counts = Counter()
+        for t in texts:
+            counts.update(WORD_RE.findall(t.lower()))
+        return cls(dict(counts))
+
+    def save(self, path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.counts, f, ensure_ascii=False, sort_keys=True)
+
+    def score(self, s: str) -> float:
+        """Mean log-probability per word (0.0 for a sentence without words)"""
+        words = WORD_RE.findall(s.lower())
+        if not words:
+            return 0.0
+        return sum(math.log((self.counts.get(w, 0) + 1) / self.total) for w in words) / len(words)
+
+
+class PreRanker:
+    """
+    Cheap dominance pruning before the MLM, over four features:
+    - entities: fewer entity_defects is better
+    - amounts: fewer amount_defects is better
+    - lexicon: more capitalized lexicon names is better
+    - unigram: higher mean unigram log-prob (only with a unigram table); scores
+      within `unigram_margin` of each other count as equal
+    A candidate is dropped only when another one is at least as good on every
+    feature and strictly better on one, so candidates that trade one feature
+    for another all go to the MLM (e.g. a fixed 'at' against grouped amounts,
+    which the MLM may prefer). A single survivor needs no MLM call.
+    """
+
+    def __init__(self, names_lex: List[str], unigrams: Optional[UnigramTable] = None, unigram_margin: float = 1.0):
+        self.name_words = {w.lower() for n in names_lex for w in n.split()}
+        self.unigrams = unigrams
+        self.unigram_margin = unigram_margin
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.calls = 0
+        self.skipped_mlm = 0
+        self.cands_in = 0
+        self.cands_out = 0
+        # Dropped candidates whose dominator was strictly better on each feature
+        self.dominated_on = {f: 0 for f in PRERANK_FEATURES}
+
+    def lexicon_hits(self, s: str) -> int:
+        hits = 0
+        for tok in s.split():
+            t = tok.strip(STRIP)
+            if t[:1].isupper() and t.lower() in self.name_words:
+                hits += 1
+        return hits
+
+    def features(self, s: str) -> Tuple[float, ...]:
+        """(entities, amounts, lexicon, unigram) values, higher is better"""
+        uni = self.unigrams.score(s) if self.unigrams is not None else 0.0
+        return (-entity_defects(s), -amount_defects(s), self.lexicon_hits(s), uni)
+
+    def _compare(self, a: Tuple[float, ...], b: Tuple[float, ...]) -> Optional[List[str]]:
+        """Features on which a is strictly better than b if a dominates b, else None"""
+        better = []
+        for name, x, y in zip(PRERANK_FEATURES, a, b):
+            margin = self.unigram_margin if name == 'unigram' else 0
+            if x < y - margin:
+                return None
+            if x > y + margin:
+                better.append(name)
+        return better or None
+
+    def prune(self, candidates: List[str]) -> List[str]:
+        keep, dominated_on = list(candidates), []
+        if len(candidates) > 1:
+            feats = [self.features(c) for c in candidates]
+            keep = []
+            for i, c in enumerate(candidates):
+                better = None
+                for j in range(len(candidates)):
+                    if j != i:
+                        better = self._compare(feats[j], feats[i])
+                        if better:
+                            break
+                if better:
+                    dominated_on += better
+                else:
+                    keep.append(c)
+        with self._lock:
+            self.calls += 1
+            self.skipped_mlm += len(candidates) > 1 and len(keep) == 1
+            self.cands_in += len(candidates)
+            self.cands_out += len(keep)
+            for name in dominated_on:
+                self.dominated_on[name] += 1
+        return keep
+
+    def stats(self) -> Dict[str, float]:
+        """Share of candidates dropped (overall and by dominating feature) and MLM calls avoided"""
+        with self._lock:
+            n = self.cands_in
+            out = {"pruned": 1 - self.cands_out / n if n else 0.0}
+            out.update({f"pruned_on_{f}": v / n if n else 0.0 for f, v in self.dominated_on.items()})
+            out["mlm_skipped"] = self.skipped_mlm / self.calls if self.calls else 0.0
+            return out
+
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Build a unigram count table for the pre-ranker from JSONL 'text' fields")
+    ap.add_argument("--corpus", required=True, help="JSONL with a 'text' field per line")
+    ap.add_argument("--out", default="data/unigrams.json")
+    args = ap.parse_args()
+    texts = (json.loads(line)["text"] for line in open(args.corpus, 'r', encoding='utf-8'))
+    table = UnigramTable.build(texts)
+    table.save(args.out)
+    print(f"{len(table.counts)} words -> {args.out}")
@@ -0,0 +1,260 @@
+import json
+import os
+import zlib
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+try:
+    import onnxruntime as ort  # type: ignore
+except Exception:
+    ort = None
+
+try:
+    import onnx  # type: ignore
+    from onnx import helper, numpy_helper, TensorProto
+except Exception:
+    onnx = None
+
+# Punctuation/casing tagger: a linear model over hashed per-word features,
+# exported to ONNX as Gather -> ReduceSum -> Add. One session run tags every
+# word of an utterance with the punctuation that follows it and whether it
+# starts with a capital letter.
+
+PUNCT_LABELS = ('', ',', '.', '?', ':')
+PUNCT_CHARS = ',.?!:;'
+NUM_FEATURES = 24      # feature slots per word; unused slots hold the all-zero bucket 0
+METADATA_KEY = "punct_tagger"
+
+
+def _bucket(feat: str, dim: int) -> int:
+    # Stable across processes (unlike hash()); bucket 0 is reserved for padding
+    return zlib.crc32(feat.encode('utf-8')) % (dim - 1) + 1
+
+
+def _shape(w: str) -> str:
+    if '@' in w:
+        return 'email'
+    if w.startswith('₹') or w[:1].isdigit():
+        return 'num'
+    if not w[:1].isalpha():
+        return 'sym'
+    return 'len' + str(min(len(w), 8))
+
+
+def _split_word(tok: str) -> Tuple[str, str]:
+    """(word, trailing punctuation); an abbreviation (U.S., e.g.) keeps its final dot"""
+    w = tok.rstrip(PUNCT_CHARS)
+    tail = tok[len(w):]
+    if '.' in w and tail.startswith('.'):
+        w, tail = w + '.', tail[1:]
+    return w, tail
+
+
+def strip_punctuation(text: str) -> str:
+    """Drop sentence punctuation at word ends; dots inside emails, amounts and abbreviations stay"""
+    words = [_split_word(t)[0] for t in text.split()]
+    return ' '.join(w for w in words if w)
+
+
+def word_features(words: List[str], names: frozenset, dim: int) -> np.ndarray:
+    """[n_words, NUM_FEATURES] hashed feature ids for unpunctuated words"""
+    low = [w.lower() for w in words]
+    n = len(low)
+    pad = ['<s>', '<s>'] + low + ['</s>', '</s>']
+    first = low[0] if low else ''
+    out = np.zeros((n, NUM_FEATURES), dtype=np.int64)
+    for i, w in enumerate(low):
+        p2, p1, n1, n2 = pad[i], pad[i + 1], pad[i + 3], pad[i + 4]
+        feats = [
+            'bias',
+            'w=' + w, 'p1=' + p1, 'n1=' + n1, 'p2=' + p2, 'n2=' + n2,
+            'p1w=' + p1 + '|' + w, 'wn1=' + w + '|' + n1, 'n1n2=' + n1 + '|' + n2,
+            'suf=' + w[-3:], 'shape=' + _shape(w), 'n1shape=' + (_shape(n1) if i + 1 < n else 'end'),
+            'name=' + str(w.capitalize() in names or words[i] in names),
+            'n1name=' + str(i + 1 < n and n1.capitalize() in names),
+            'first=' + first, 'first|pos=' + first + '|' + ('last' if i == n - 1 else str(min(i, 3))),
+            'pos=' + str(min(i, 5)), 'rpos=' + str(min(n - 1 - i, 5)),
+            'len=' + str(min(n // 5, 6)), 'last=' + str(i == n - 1),
+        ]
+        for j, f in enumerate(feats):
+            out[i, j] = _bucket(f, dim)
+    return out
+
+
+def word_labels(gold: str) -> Tuple[List[str], List[int], List[int]]:
+    """Gold text -> (unpunctuated words, punctuation label ids, capitalized flags)"""
+    words, punct, caps = [], [], []
+    for tok in gold.split():
+        w, tail = _split_word(tok)
+        if not w:
+            continue
+        mark = next((c for c in tail if c in PUNCT_LABELS), '')
+        if not mark and '!' in tail:
+            mark = '.'
+        words.append(w)
+        punct.append(PUNCT_LABELS.index(mark) if mark else 0)
+        caps.append(int(w[:1].isupper()))
+    return words, punct, caps
+
+
+def build_onnx(w_punct: np.ndarray, b_punct: np.ndarray, w_case: np.ndarray, b_case: np.ndarray, meta: Dict) -> 'onnx.ModelProto':
+    """features [N, F] int64 -> punct_logits [N, P], case_logits [N, 2]"""
+    feats = helper.make_tensor_value_info('features', TensorProto.INT64, ['words', NUM_FEATURES])
+    outs = [helper.make_tensor_value_info('punct_logits', TensorProto.FLOAT, ['words', w_punct.shape[1]]),
+            helper.make_tensor_value_info('case_logits', TensorProto.FLOAT, ['words', 2])]
+    nodes, inits = [], [numpy_helper.from_array(np.array([1], dtype=np.int64), 'axis1')]
+    for head, w, b in (('punct', w_punct, b_punct), ('case', w_case, b_case)):
+        inits += [numpy_helper.from_array(w.astype(np.float32), f'{head}_W'),
+                  numpy_helper.from_array(b.astype(np.float32), f'{head}_b')]
+        nodes += [helper.make_node('Gather', [f'{head}_W', 'features'], [f'{head}_g']),
+                  helper.make_node('ReduceSum', [f'{head}_g', 'axis1'], [f'{head}_s'], keepdims=0),
+                  helper.make_node('Add', [f'{head}_s', f'{head}_b'], [f'{head}_logits'])]
+    graph = helper.make_graph(nodes, 'punct_tagger', [feats], outs, inits)
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid('', 13)])
+    model.ir_version = 8
+    entry = model.metadata_props.add()
+    entry.key, entry.value = METADATA_KEY, json.dumps(meta)
+    onnx.checker.check_model(model)
+    return model
+
+
+def train(golds: Iterable[str], names_lex: List[str], dim: int = 1 << 16, epochs: int = 8,
+          lr: float = 0.5, l2: float = 1e-6, seed: int = 0):
+    """
+    Multinomial logistic regression (AdaGrad) for both heads over hashed features.
+    Returns (w_punct, b_punct, w_case, b_case).
+    """
+    names = frozenset(names_lex)
+    X, Yp, Yc = [], [], []
+    for g in golds:
+        words, punct, caps = word_labels(g)
+        if words:
+            X.append(word_features(words, names, dim))
+            Yp += punct
+            Yc += caps
+    X = np.concatenate(X)
+    Yp, Yc = np.array(Yp), np.array(Yc)
+    rng = np.random.default_rng(seed)
+    heads = []
+    for y, k in ((Yp, len(PUNCT_LABELS)), (Yc, 2)):
+        w = np.zeros((dim, k), dtype=np.float64)
+        b = np.zeros(k, dtype=np.float64)
+        gw = np.full((dim, k), 1e-8)
+        gb = np.full(k, 1e-8)
+        for _ in range(epochs):
+            for batch in np.array_split(rng.permutation(len(y)), max(1, len(y) // 32)):
+                xb, yb = X[batch], y[batch]
+                logits = w[xb].sum(axis=1) + b
+                logits -= logits.max(axis=1, keepdims=True)
+                p = np.exp(logits)
+                p /= p.sum(axis=1, keepdims=True)
+                p[np.arange(len(yb)), yb] -= 1          # d loss / d logits
+                # Sparse update: only the buckets present in the batch
+                rows, inv = np.unique(xb, return_inverse=True)
+                grad = np.zeros((len(rows), k))
+                np.add.at(grad, inv.reshape(xb.shape), p[:, None, :])
+                grad += l2 * w[rows]
+                grad[rows == 0] = 0                      # padding bucket stays zero
+                gw[rows] += grad ** 2
+                w[rows] -= lr * grad / np.sqrt(gw[rows])
+                gbatch = p.sum(axis=0)
+                gb += gbatch ** 2
+                b -= lr * gbatch / np.sqrt(gb)
+        heads += [w, b]
+    return tuple(heads)
+
+
+class PunctTagger:
+    """Loads an exported tagger and re-punctuates / re-cases text in one ONNX run per utterance"""
+
+    def __init__(self, path: str, names_lex: List[str]):
+        if ort is None:
+            raise RuntimeError("onnxruntime is required for the punctuation tagger")
+        if not os.path.exists(path):
+            raise ValueError(f"no punctuation tagger at {path}; train one with python -m src.punct_tagger")
+        opts = ort.SessionOptions()
+        opts.intra_op_num_threads = 1
+        opts.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(path, sess_options=opts, providers=['CPUExecutionProvider'])
+        meta = self.session.get_modelmeta().custom_metadata_map.get(METADATA_KEY)
+        if meta is None:
+            raise ValueError(f"{path} is not a punctuation tagger model")
+        self.dim = json.loads(meta)["dim"]
+        self.names = frozenset(names_lex)
+
+    def tag(self, words: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """Per-word punctuation label ids and capitalized flags"""
+        punct, case = self.session.run(None, {"features": word_features(words, self.names, self.dim)})
+        return punct.argmax(axis=1), case.argmax(axis=1)
+
+    def punctuate(self, text: str) -> str:
+        words = strip_punctuation(text).split()
+        if not words:
+            return text
+        punct, caps = self.tag(words)
+        # Every utterance ends in punctuation
+        if punct[-1] == 0:
+            punct[-1] = PUNCT_LABELS.index('.')
+        out = []
+        sentence_start = True
+        for w, p, c in zip(words, punct, caps):
+            # Casing only ever adds a capital: names and words the ranked text
+            # already capitalizes are never lowered
+            if w[:1].islower() and (c or sentence_start or w.capitalize() in self.names):
+                w = w[:1].upper() + w[1:]
+            mark = PUNCT_LABELS[p]
+            out.append(w + ('' if mark == '.' and w.endswith('.') else mark))
+            sentence_start = PUNCT_LABELS[p] in ('.', '?')
+        return ' '.join(out)
+
+
+def evaluate(golds: List[str], w_punct, b_punct, w_case, b_case, names_lex: List[str], dim: int) -> Dict[str, float]:
+    """Per-word punctuation accuracy / macro-F1 over the non-empty labels, and casing accuracy"""
+    names = frozenset(names_lex)
+    tp = np.zeros(len(PUNCT_LABELS)); fp = np.zeros(len(PUNCT_LABELS)); fn = np.zeros(len(PUNCT_LABELS))
+    n = correct = case_ok = 0
+    for g in golds:
+        words, punct, caps = word_labels(g)
+        if not words:
+            continue
+        x = word_features(words, names, dim)
+        pp = (w_punct[x].sum(axis=1) + b_punct).argmax(axis=1)
+        pc = (w_case[x].sum(axis=1) + b_case).argmax(axis=1)
+        for y, p in zip(punct, pp):
+            tp[p] += y == p
+            fp[p] += y != p
+            fn[y] += y != p
+        n += len(words)
+        correct += int((pp == np.array(punct)).sum())
+        case_ok += int((pc == np.array(caps)).sum())
+    f1 = 2 * tp / np.maximum(2 * tp + fp + fn, 1)
+    return {"punct_acc": correct / max(n, 1), "punct_f1": float(f1[1:].mean()), "case_acc": case_ok / max(n, 1)}
+
+
+if __name__ == "__main__":
+    import argparse, random
+    ap = argparse.ArgumentParser(description="Train the punctuation/casing tagger on gold transcripts and export it to ONNX")
+    ap.add_argument("--corpus", nargs="+", default=["data/gold.jsonl"], help="JSONL with punctuated 'text' fields (e.g. + out/synth/gold.jsonl)")
+    ap.add_argument("--names", default="data/names_lexicon.txt")
+    ap.add_argument("--out", default="models/punct_tagger.onnx")
+    ap.add_argument("--dim", type=int, default=1 << 16, help="hashed feature buckets")
+    ap.add_argument("--epochs", type=int, default=8)
+    ap.add_argument("--holdout", type=float, default=0.2, help="share of lines held out for the printed scores")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+    if onnx is None:
+        raise SystemExit("onnx is required to export the tagger")
+    golds = [json.loads(line)["text"] for path in args.corpus for line in open(path, 'r', encoding='utf-8') if line.strip()]
+    names_lex = [x.strip() for x in open(args.names, 'r', encoding='utf-8') if x.strip()]
+    random.Random(args.seed).shuffle(golds)
+    n_dev = int(len(golds) * args.holdout)
+    dev, train_set = golds[:n_dev], golds[n_dev:]
+    if dev:
+        heads = train(train_set, names_lex, args.dim, args.epochs, seed=args.seed)
+        print("held out:", " ".join(f"{k}={v:.4f}" for k, v in evaluate(dev, *heads, names_lex, args.dim).items()))
+    # The exported model is trained on every line
+    heads = train(golds, names_lex, args.dim, args.epochs, seed=args.seed)
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    onnx.save_model(build_onnx(*heads, meta={"dim": args.dim, "labels": PUNCT_LABELS}), args.out)
+    print(f"{len(golds)} lines -> {args.out}")
@@ -1,5 +1,13 @@
-from typing import List, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from difflib import SequenceMatcher
+from typing import List, Optional, Tuple
+import copy
+import os
+import threading
+import time
 import numpy as np
+from .shared_weights import external_weight_bytes
+from .vocab_head import model_vocab_map
 
 # Optional imports guarded to allow partial environments
 try:
@@ -7,40 +15,207 @@ try:
 except Exception:
     ort = None
 
+# The tokenizer comes from transformers for both backends; only the Torch backend needs torch
 try:
-    import torch
     from transformers import AutoTokenizer, AutoModelForMaskedLM
 except Exception:
-    torch = None
     AutoTokenizer = None
     AutoModelForMaskedLM = None
 
+try:
+    import torch
+except Exception:
+    torch = None
+
+# Approximate PLL: how the k masked positions per candidate are picked
+#   stride - evenly spaced over the sentence
+#   diff   - wordpieces that differ from the other candidates first
+#   rare   - rarest wordpieces first (WordPiece ids are assigned roughly in frequency order)
+PLL_STRATEGIES = ('stride', 'diff', 'rare')
+
+# Host-specific settings a tuned profile may set (python -m src.autotune):
+#   intra_op_threads / inter_op_threads - ORT thread pools (single-caller mode)
+#   execution_mode   - 'sequential' or 'parallel' ORT graph execution
+#   graph_opt_level  - 'disable', 'basic', 'extended' or 'all'
+#   max_batch_rows   - masked rows per forward pass on the batched path
+#   seq_bucket       - pad batches to a multiple of this length (0 = longest row)
+#   batched          - exact PLL through the batched path instead of one masked row per call
+TUNING_KEYS = ('intra_op_threads', 'inter_op_threads', 'execution_mode', 'graph_opt_level',
+               'max_batch_rows', 'seq_bucket', 'batched')
+EXECUTION_MODES = ('sequential', 'parallel')
+GRAPH_OPT_LEVELS = ('disable', 'basic', 'extended', 'all')
+
+def layer_tier_path(onnx_path: str, layers: int) -> str:
+    """models/distilbert-base-uncased.int8.onnx -> models/distilbert-base-uncased.L2.int8.onnx"""
+    root, name = os.path.split(onnx_path)
+    stem, dot, rest = name.partition('.')
+    return os.path.join(root, f"{stem}.L{layers}{dot}{rest}")
+
+def truncate_layers(model, layers: int):
+    """Keep only the first `layers` transformer blocks of an HF masked LM (embeddings and vocab projector stay)"""
+    base = model.base_model
+    stack = base.transformer if hasattr(base, 'transformer') else base.encoder
+    total = len(stack.layer)
+    if not 1 <= layers <= total:
+        raise ValueError(f"layers must be between 1 and {total}, got {layers}")
+    stack.layer = stack.layer[:layers]
+    if hasattr(stack, 'n_layers'):
+        stack.n_layers = layers
+    model.config.num_hidden_layers = layers
+    return model
+
 class PseudoLikelihoodRanker:
-    def __init__(self, model_name: str = "distilbert-base-uncased", onnx_path: str = None, device: str = "cpu", max_length: int = 64):
+    """
+    Thread safety: with inference_threads=N one ranker can be shared by any number
+    of caller threads. They all use one InferenceSession; tokenization runs on the
+    caller thread with a per-thread tokenizer copy (HF fast tokenizers are not safe
+    to share), and every model call goes through an N-worker pool with at most 2N
+    calls in flight. intra_op_num_threads is set to cpu_count // N so the
+    concurrent ORT calls split the cores instead of oversubscribing them.
+    Without inference_threads the ranker is meant for a single thread.
+
+    Memory: ORT memory-maps a model's external weights file, but by default it
+    then prepacks the MatMul weights into private per-process buffers. With
+    share_weights=True prepacking is disabled, so kernels read the weights
+    straight from the read-only file mapping and every worker process on the
+    host shares one page-cache copy. The model must keep its weights in an
+    external file (python -m src.export_onnx --external_data); weights inlined
+    in the .onnx are always copied into private memory.
+
+    Torch backend (used when no ONNX model is given): exact PLL scores each
+    candidate with _score_with_torch, one batch of its masked rows.
+
+    Ranking tiers: layers=N ranks with a DistilBERT cut to its first N
+    transformer blocks. With ONNX this loads the tier exported next to
+    onnx_path (python -m src.export_onnx --layers N, see layer_tier_path);
+    the Torch backend truncates the model it loads.
+
+    Domain vocab head: an ONNX model built by python -m src.vocab_head outputs
+    logits only for its domain wordpieces plus a catch-all column. Its kept ids
+    come from the model metadata and self.vocab_map sends token ids to their
+    output column, so log-probs are normalized over the reduced head.
+
+    tuning: host-specific settings from a tuned profile (see TUNING_KEYS); the
+    thread settings apply only without inference_threads, whose core split wins.
+    """
+    def __init__(self, model_name: str = "distilbert-base-uncased", onnx_path: str = None, device: str = "cpu", max_length: int = 64,
+                 pll_k: int = None, pll_strategy: str = "stride", windowed: bool = False, window_stride: int = None,
+                 inference_threads: int = None, share_weights: bool = False,
+                 layers: int = None, tuning: dict = None):
+        tuning = dict(tuning or {})
+        unknown = set(tuning) - set(TUNING_KEYS)
+        if unknown:
+            raise ValueError(f"unknown tuning settings {sorted(unknown)}; expected some of {TUNING_KEYS}")
+        if tuning.get('execution_mode', 'sequential') not in EXECUTION_MODES:
+            raise ValueError(f"execution_mode must be one of {EXECUTION_MODES}, got {tuning['execution_mode']!r}")
+        if tuning.get('graph_opt_level', 'all') not in GRAPH_OPT_LEVELS:
+            raise ValueError(f"graph_opt_level must be one of {GRAPH_OPT_LEVELS}, got {tuning['graph_opt_level']!r}")
+        if pll_strategy not in PLL_STRATEGIES:
+            raise ValueError(f"pll_strategy must be one of {PLL_STRATEGIES}, got {pll_strategy!r}")
+        # pll_k=None scores every position (exact PLL); otherwise only k positions per candidate
+        self.pll_k = pll_k
+        self.pll_strategy = pll_strategy
+        # windowed=True scores long inputs in overlapping max_length windows instead of truncating them
+        self.windowed = windowed
+        self.window_stride = window_stride
         self.max_length = max_length
         self.model_name = model_name
         self.onnx = None
         self.torch_model = None
         self.device = device
+        self.inference_threads = inference_threads
+        self.share_weights = share_weights
+        # layers=None uses every transformer block of the model
+        self.layers = layers
+        self.onnx_path = None
+        # Token id -> logits column for a domain vocab head (None: full vocabulary)
+        self.vocab_map = None
+        self.tuning = tuning
+        self.seq_bucket = tuning.get('seq_bucket', 0)
+        self.batched = tuning.get('batched', False)
+        self._pool = None
+        self._slots = None
+        self._local = threading.local()
+        self._tok_lock = threading.Lock()
         self.tokenizer = None
+        # Batched span scoring: rows per forward pass, and a running cost estimate used for latency budgets
+        self.max_batch_rows = 32
+        self.ms_per_row = None
+        if AutoTokenizer is None:
+            raise RuntimeError("transformers is required for the tokenizer. Please install requirements.")
         if onnx_path and ort is not None:
             self._init_onnx(onnx_path)
-        elif AutoTokenizer is not None and AutoModelForMaskedLM is not None:
+        elif torch is not None and AutoModelForMaskedLM is not None:
             self._init_torch()
         else:
-            raise RuntimeError("Neither onnxruntime nor transformers/torch are available. Please install requirements.")
+            raise RuntimeError("No model backend: pass onnx_path (needs onnxruntime) or install torch. Please install requirements.")
+        if 'max_batch_rows' in tuning:
+            self.max_batch_rows = tuning['max_batch_rows']
+        if inference_threads:
+            self._pool = ThreadPoolExecutor(max_workers=inference_threads, thread_name_prefix="ranker-infer")
+            self._slots = threading.BoundedSemaphore(2 * inference_threads)
+
+    @property
+    def tokenizer(self):
+        if self._pool is None:
+            return self._tokenizer
+        tok = getattr(self._local, "tokenizer", None)
+        if tok is None:
+            with self._tok_lock:
+                tok = copy.deepcopy(self._tokenizer)
+            self._local.tokenizer = tok
+        return tok
+
+    @tokenizer.setter
+    def tokenizer(self, tok):
+        self._tokenizer = tok
+
+    def close(self):
+        """Shut down the inference pool (concurrent mode only)"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
 
     def _init_onnx(self, onnx_path: str):
+        if self.layers:
+            onnx_path = layer_tier_path(onnx_path, self.layers)
+            if not os.path.exists(onnx_path):
+                raise ValueError(f"no {self.layers}-layer ranking tier at {onnx_path}; "
+                                 f"export it with python -m src.export_onnx --layers {self.layers}")
+        self.onnx_path = onnx_path
         self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
         sess_options = ort.SessionOptions()
-        sess_options.intra_op_num_threads = 1
-        sess_options.inter_op_num_threads = 1
+        tuning = self.tuning
+        threads = tuning.get('intra_op_threads', 1)
+        inter = tuning.get('inter_op_threads', 1)
+        if self.inference_threads:
+            # Split the cores between the concurrent ORT calls
+            threads = max(1, (os.cpu_count() or 1) // self.inference_threads)
+            inter = 1
+        sess_options.intra_op_num_threads = threads
+        sess_options.inter_op_num_threads = inter
+        if tuning.get('execution_mode') == 'parallel':
+            sess_options.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+        if 'graph_opt_level' in tuning:
+            sess_options.graph_optimization_level = {
+                'disable': ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+                'basic': ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+                'extended': ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+                'all': ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+            }[tuning['graph_opt_level']]
+        if self.share_weights:
+            if not external_weight_bytes(onnx_path):
+                raise ValueError(f"{onnx_path} has no external weights to share; re-export it with --external_data")
+            sess_options.add_session_config_entry("session.disable_prepacking", "1")
         self.onnx = ort.InferenceSession(onnx_path, sess_options=sess_options, providers=['CPUExecutionProvider'])
+        self.vocab_map = model_vocab_map(self.onnx.get_modelmeta().custom_metadata_map, len(self._tokenizer))
 
     def _init_torch(self):
         self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
         self.torch_model = AutoModelForMaskedLM.from_pretrained(self.model_name)
         self.torch_model.eval()
+        if self.layers:
+            truncate_layers(self.torch_model, self.layers)
         self.torch_model.to(self.device)
 
     def _batch_mask_positions(self, input_ids: np.ndarray, attn: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
@@ -82,19 +257,16 @@ class PseudoLikelihoodRanker:
             orig_token_id = int(masked[pos])
             masked[pos] = mask_id
 
-            ort_inputs = {
-                "input_ids": masked[None, :].astype(np.int64),   # (1, L)
-                "attention_mask": attn.astype(np.int64),         # (1, L)
-            }
-
             # Run the model: logits shape (1, L, V)
-            logits = self.onnx.run(None, ort_inputs)[0]
+            logits = self._forward_logits(masked[None, :], attn)
             logits_pos = logits[0, pos, :]                       # (V,)
 
             # log-softmax in a numerically stable way
             m = logits_pos.max()
             log_probs = logits_pos - m - np.log(np.exp(logits_pos - m).sum())
 
+            if self.vocab_map is not None:
+                orig_token_id = self.vocab_map[orig_token_id]
             total += float(log_probs[orig_token_id])
 
         return total  # higher = better
@@ -119,7 +291,6 @@ class PseudoLikelihoodRanker:
     #     return float(picked.sum())  # higher = better
 
     def _score_with_torch(self, text: str) -> float:
-        import torch
         toks = self.tokenizer(text, return_tensors="pt", truncation=True, max_length=self.max_length).to(self.device)
         input_ids = toks["input_ids"]
         attn = toks["attention_mask"]
@@ -142,12 +313,234 @@ class PseudoLikelihoodRanker:
             picked = log_probs[torch.arange(len(rows)), token_ids]
         return float(picked.sum().item())
 
-    def score(self, sentences: List[str]) -> List[float]:
+    def _forward_logits(self, input_ids: np.ndarray, attn: np.ndarray, positions: np.ndarray = None) -> np.ndarray:
+        """
+        Masked-LM logits [B, L, V], or [B, V] at positions[b] of each row b when
+        positions is given; in concurrent mode the call runs on the inference pool
+        """
+        if self._pool is None:
+            return self._run_model(input_ids, attn, positions)
+        # Bounded: callers block here rather than queueing without limit
+        with self._slots:
+            return self._pool.submit(self._run_model, input_ids, attn, positions).result()
+
+    def _run_model(self, input_ids: np.ndarray, attn: np.ndarray, positions: np.ndarray = None) -> np.ndarray:
+        """Masked-LM logits from whichever backend is loaded (see _forward_logits)"""
+        if self.onnx is not None:
+            ort_inputs = {"input_ids": input_ids.astype(np.int64), "attention_mask": attn.astype(np.int64)}
+            logits = self.onnx.run(None, ort_inputs)[0]
+        else:
+            with torch.no_grad():
+                logits = self.torch_model(
+                    input_ids=torch.from_numpy(input_ids.astype(np.int64)).to(self.device),
+                    attention_mask=torch.from_numpy(attn.astype(np.int64)).to(self.device),
+                ).logits.cpu().numpy()
+        if positions is None:
+            return logits
+        return logits[np.arange(len(positions)), positions]
+
+    def score_spans(self, items: List[Tuple[str, int, int]]) -> List[float]:
+        """
+        Partial pseudo-log-likelihood for lattice search.
+        For each (text, start, end), sum log p(token) over the wordpieces whose
+        characters overlap text[start:end]. The masked rows of all items share
+        batched forward passes of at most max_batch_rows rows.
+        """
+        if not items:
+            return []
+        enc = self._encode([t for t, _, _ in items], offsets=True)
+        seqs, positions = [], []
+        for ids, offs, (_, start, end) in zip(enc["input_ids"], enc["offset_mapping"], items):
+            seqs.append(ids)
+            positions.append([pos for pos in range(1, len(ids) - 1) if offs[pos][0] < end and offs[pos][1] > start])
+        return self._score_positions(seqs, positions)
+
+    def _encode(self, sentences: List[str], offsets: bool = False):
+        """Token id lists with [CLS]/[SEP]; truncated to max_length unless windowed"""
+        if self.windowed:
+            return self.tokenizer(sentences, return_offsets_mapping=offsets)
+        return self.tokenizer(sentences, truncation=True, max_length=self.max_length, return_offsets_mapping=offsets)
+
+    def _window_starts(self, n: int) -> List[int]:
+        # Content (non-special) start offsets of overlapping windows covering n content tokens
+        W = self.max_length - 2
+        stride = max(1, self.window_stride or W // 2)
+        return list(range(0, n - W, stride)) + [n - W]
+
+    def _score_positions(self, seqs: List[List[int]], positions: List[List[int]]) -> List[float]:
+        """
+        Sum log p over the given masked positions of each sequence.
+        Sequences longer than max_length are split into overlapping windows of
+        max_length; each position is scored in only one window, the one where it
+        has the most context on both sides. The windows of all sequences share
+        the same batched forward passes.
+        """
+        return self._score_layout(self._layout(seqs, positions))
+
+    def _layout(self, seqs: List[List[int]], positions: List[List[int]]) -> Tuple:
+        """Padded windows and masked rows for _score_layout (CPU only, no model call)"""
+        W = self.max_length - 2
+        windows, owner = [], []
+        row_item, row_pos = [], []
+        for i, (ids, pos_list) in enumerate(zip(seqs, positions)):
+            if len(ids) <= self.max_length:
+                row_item += [len(windows)] * len(pos_list)
+                row_pos += pos_list
+                windows.append(ids)
+                owner.append(i)
+                continue
+            content = ids[1:-1]
+            starts = self._window_starts(len(content))
+            first = len(windows)
+            for st in starts:
+                windows.append([ids[0]] + content[st:st + W] + [ids[-1]])
+                owner.append(i)
+            for p in pos_list:
+                c = p - 1
+                j = max((j for j, st in enumerate(starts) if st <= c < st + W),
+                        key=lambda j: min(c - starts[j], starts[j] + W - 1 - c))
+                row_item.append(first + j)
+                row_pos.append(c - starts[j] + 1)
+
+        L = max(len(w) for w in windows)
+        if self.seq_bucket:
+            # Fewer distinct shapes, so ORT can reuse its buffers across batches
+            L = -(-L // self.seq_bucket) * self.seq_bucket
+        pad_id = self.tokenizer.pad_token_id or 0
+        input_ids = np.full((len(windows), L), pad_id, dtype=np.int64)
+        attn = np.zeros((len(windows), L), dtype=np.int64)
+        for r, w in enumerate(windows):
+            input_ids[r, :len(w)] = w
+            attn[r, :len(w)] = 1
+        return input_ids, attn, row_item, row_pos, owner, len(seqs)
+
+    def _score_layout(self, layout: Tuple) -> List[float]:
+        input_ids, attn, row_item, row_pos, owner, n_seqs = layout
+        win_scores = self._score_rows(input_ids, attn, row_item, row_pos, len(input_ids))
+        scores = [0.0] * n_seqs
+        for i, sc in zip(owner, win_scores):
+            scores[i] += sc
+        return scores
+
+    def _score_rows(self, input_ids: np.ndarray, attn: np.ndarray, row_item: List[int], row_pos: List[int], n_items: int) -> List[float]:
+        """Mask input_ids[row_item[r], row_pos[r]] for every row r, run the rows in batches and sum log p per item"""
+        scores = np.zeros(n_items, dtype=np.float64)
+        if not row_item:
+            return scores.tolist()
+
+        row_item = np.array(row_item, dtype=np.int64)
+        row_pos = np.array(row_pos, dtype=np.int64)
+        mask_id = self.tokenizer.mask_token_id
+        t0 = time.perf_counter()
+        for c in range(0, len(row_item), self.max_batch_rows):
+            items_c = row_item[c:c + self.max_batch_rows]
+            pos_c = row_pos[c:c + self.max_batch_rows]
+            rows = np.arange(len(items_c))
+            batch = input_ids[items_c].copy()
+            token_ids = batch[rows, pos_c]
+            batch[rows, pos_c] = mask_id
+            # log softmax per row at the masked position
+            logits_pos = self._forward_logits(batch, attn[items_c], pos_c)  # [B, V]
+            m = logits_pos.max(axis=1, keepdims=True)
+            log_probs = logits_pos - m - np.log(np.exp(logits_pos - m).sum(axis=1, keepdims=True))
+            if self.vocab_map is not None:
+                token_ids = self.vocab_map[token_ids]
+            np.add.at(scores, items_c, log_probs[rows, token_ids])
+        dt = (time.perf_counter() - t0) * 1000 / len(row_item)
+        self.ms_per_row = dt if self.ms_per_row is None else 0.8 * self.ms_per_row + 0.2 * dt
+        return scores.tolist()
+
+    def _sample_positions(self, ids: List[int], others: List[List[int]], k: int, strategy: str) -> List[int]:
+        """Deterministically pick k positions out of 1..len(ids)-2 (ids include [CLS]/[SEP])"""
+        positions = list(range(1, len(ids) - 1))
+        if k >= len(positions):
+            return positions
+        if strategy == 'rare':
+            picked = sorted(positions, key=lambda p: (-ids[p], p))[:k]
+            return sorted(picked)
+        stride = [positions[int(i * len(positions) / k)] for i in range(k)]
+        if strategy == 'stride':
+            return stride
+        # 'diff': positions outside the blocks shared with every other candidate
+        same = set(positions)
+        for o in others:
+            shared = set()
+            for a, _, size in SequenceMatcher(None, ids, o, autojunk=False).get_matching_blocks():
+                shared.update(range(a, a + size))
+            same &= shared
+        diff = [p for p in positions if p not in same]
+        if len(diff) > k:
+            return [diff[int(i * len(diff) / k)] for i in range(k)]
+        # Top up with evenly spaced shared positions
+        rest = [p for p in stride if p not in diff] + [p for p in positions if p not in diff and p not in stride]
+        return sorted(diff + rest[:k - len(diff)])
+
+    def score_sampled(self, sentences: List[str], k: int, strategy: str = None) -> List[float]:
+        """
+        Approximate PLL: sum log p over only k masked positions per sentence,
+        chosen by `strategy` (see PLL_STRATEGIES); all rows share batched forward passes.
+        """
+        return self.score_prepared(self.prepare(sentences, k, strategy))
+
+    def score_full(self, sentences: List[str]) -> List[float]:
+        """Exact PLL over every position, through the batched (and, if enabled, windowed) path"""
+        return self.score_prepared(self.prepare(sentences))
+
+    def prepare(self, sentences: List[str], k: int = None, strategy: str = None) -> Tuple:
+        """
+        The CPU half of score_full (k=None) / score_sampled: tokenization and the
+        padded masked-row layout. score_prepared runs the model on the result, so
+        a pipeline can prepare the next utterance while the current one is scored.
+        """
+        seqs = self._encode(sentences)["input_ids"]
+        if k is None:
+            positions = [list(range(1, len(ids) - 1)) for ids in seqs]
+        else:
+            strategy = strategy or self.pll_strategy
+            positions = []
+            for i, ids in enumerate(seqs):
+                others = seqs[:i] + seqs[i + 1:] if strategy == 'diff' else []
+                positions.append(self._sample_positions(ids, others, k, strategy))
+        return self._layout(seqs, positions)
+
+    def score_prepared(self, prepared: Tuple) -> List[float]:
+        """Scores for the sentences given to prepare(), in order"""
+        return self._score_layout(prepared)
+
+    def budget_k(self, n_candidates: int, budget_ms: float) -> Optional[int]:
+        """Largest k whose estimated cost fits budget_ms (None until a cost estimate exists)"""
+        if not self.ms_per_row:
+            return None
+        return max(1, int(budget_ms / (self.ms_per_row * max(1, n_candidates))))
+
+    @property
+    def rows_batched(self) -> bool:
+        """Whether score() without a budget goes through prepare/score_prepared rather than one masked row per call"""
+        return self.pll_k is not None or self.windowed or self.batched or self._pool is not None
+
+    def score(self, sentences: List[str], k: int = None, budget_ms: float = None) -> List[float]:
+        """
+        Pseudo-log-likelihood per sentence (higher = better).
+        k (default self.pll_k) switches to the sampled approximation; with budget_ms
+        and no fixed k, k is derived from the remaining latency budget.
+        """
+        k = self.pll_k if k is None else k
+        if k is None and budget_ms is not None:
+            k = self.budget_k(len(sentences), budget_ms)
+            if k is None:
+                # No cost estimate yet: score every position through the batched path to get one
+                return self.score_full(sentences)
+        if k is not None:
+            return self.score_sampled(sentences, k)
+        if self.rows_batched:
+            # Concurrent mode always takes the batched path, which runs on the inference pool;
+            # a tuned profile picks it when it beats one masked row per call on this host
+            return self.score_full(sentences)
         return [self._score_with_onnx(s) if self.onnx is not None else self._score_with_torch(s) for s in sentences]
 
-    def choose_best(self, candidates: List[str]) -> str:
+    def choose_best(self, candidates: List[str], budget_ms: float = None) -> str:
         if len(candidates) == 1:
             return candidates[0]
-        scores = self.score(candidates)
+        scores = self.score(candidates, budget_ms=budget_ms)
         i = int(np.argmax(scores))
         return candidates[i]
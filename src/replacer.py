@@ -0,0 +1,176 @@
+import hashlib
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+
+def _is_word(c: str) -> bool:
+    # Same character class as the regex \w
+    return c.isalnum() or c == '_'
+
+
+def _boundary(text: str, i: int, n: int) -> bool:
+    # Regex \b: exactly one side of position i is a word character
+    return (i > 0 and _is_word(text[i - 1])) != (i < n and _is_word(text[i]))
+
+
+def _fold(text: str) -> str:
+    """Lowercase without changing the string length (offsets must stay valid)."""
+    low = text.lower()
+    if len(low) == len(text):
+        return low
+    return ''.join(c if len(c.lower()) != 1 else c.lower() for c in text)
+
+
+class MultiReplacer:
+    """
+    Aho-Corasick multi-pattern replacer.
+    - Case-insensitive, with regex-style \\b word boundaries on both ends
+    - Leftmost-longest, non-overlapping matches
+    - All patterns are applied in one linear pass over the text
+    """
+
+    def __init__(self, table: Dict[str, str]):
+        self.table = {}
+        for pat, rep in table.items():
+            key = _fold(pat)
+            if key:
+                self.table[key] = rep
+        self._build()
+
+    def _build(self):
+        goto: List[Dict[str, int]] = [{}]
+        out: List[Tuple[str, ...]] = [()]
+        for pat in self.table:
+            s = 0
+            for c in pat:
+                nxt = goto[s].get(c)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[s][c] = nxt
+                    goto.append({})
+                    out.append(())
+                s = nxt
+            out[s] = (pat,)
+
+        # Breadth-first failure links; outputs are merged along them
+        fail = [0] * len(goto)
+        queue = list(goto[0].values())
+        head = 0
+        while head < len(queue):
+            s = queue[head]
+            head += 1
+            for c, nxt in goto[s].items():
+                queue.append(nxt)
+                f = fail[s]
+                while f and c not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(c, 0)
+                out[nxt] = out[nxt] + out[fail[nxt]]
+        self._goto, self._fail, self._out = goto, fail, out
+
+    def find(self, text: str) -> List[Tuple[int, int, str]]:
+        """Return the (start, end, pattern) matches that replace() would apply."""
+        low = _fold(text)
+        goto, fail, out = self._goto, self._fail, self._out
+        n = len(text)
+        hits = []
+        s = 0
+        for i, c in enumerate(low):
+            while s and c not in goto[s]:
+                s = fail[s]
+            s = goto[s].get(c, 0)
+            if out[s]:
+                end = i + 1
+                for pat in out[s]:
+                    start = end - len(pat)
+                    # \b at both ends of the match
+                    if _boundary(text, start, n) and _boundary(text, end, n):
+                        hits.append((start, end, pat))
+        if len(hits) < 2:
+            return hits
+
+        hits.sort(key=lambda h: (h[0], h[0] - h[1]))
+        chosen = []
+        pos = 0
+        for h in hits:
+            if h[0] >= pos:
+                chosen.append(h)
+                pos = h[1]
+        return chosen
+
+    def replace(self, text: str) -> str:
+        hits = self.find(text)
+        if not hits:
+            return text
+        parts = []
+        pos = 0
+        for start, end, pat in hits:
+            parts.append(text[pos:start])
+            parts.append(self.table[pat])
+            pos = end
+        parts.append(text[pos:])
+        return ''.join(parts)
+
+    def __len__(self):
+        return len(self.table)
+
+
+def load_replacement_map(path: str) -> Dict[str, str]:
+    with open(path, 'r', encoding='utf-8') as f:
+        table = json.load(f)
+    if not isinstance(table, dict):
+        raise ValueError(f"{path}: expected a JSON object of misspelling -> correction")
+    return {str(k): str(v) for k, v in table.items()}
+
+
+def _table_hash(table: Dict[str, str]) -> str:
+    return hashlib.sha1(json.dumps(table, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class MisspellReplacer:
+    """
+    MultiReplacer built from the built-in rule tables plus a JSON misspelling map
+    (e.g. data/misspell_map.json). Entries in the file override built-in ones,
+    except that a correction differing from the built-in one only in case keeps
+    the built-in spelling (e.g. 'Counter-offer'). reload() rebuilds the
+    automaton and swaps it in, so a running process picks up edits to the map
+    without a restart. `version` is a content hash of the active table.
+    """
+
+    def __init__(self, path: Optional[str] = None, builtin: Optional[Dict[str, str]] = None):
+        self.path = path
+        self.builtin = dict(builtin or {})
+        self._mtime = None
+        self.replacer = MultiReplacer(self.builtin)
+        self.version = _table_hash(self.builtin)
+        if path:
+            self.reload()
+
+    def reload(self):
+        table = dict(self.builtin)
+        mtime = None
+        if self.path:
+            mtime = os.stat(self.path).st_mtime_ns
+            for k, v in load_replacement_map(self.path).items():
+                if table.get(k, '').lower() != v.lower():
+                    table[k] = v
+        # Build fully before swapping so concurrent readers never see a partial automaton
+        self.replacer = MultiReplacer(table)
+        self.version = _table_hash(table)
+        self._mtime = mtime
+
+    def reload_if_changed(self) -> bool:
+        """Reload when the map file's mtime moved (one stat call); returns True if it reloaded."""
+        if not self.path:
+            return False
+        if os.stat(self.path).st_mtime_ns == self._mtime:
+            return False
+        self.reload()
+        return True
+
+    def replace(self, text: str) -> str:
+        return self.replacer.replace(text)
+
+    def __len__(self):
+        return len(self.replacer)
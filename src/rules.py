@@ -1,9 +1,23 @@
 import re
 from typing import List
 from rapidfuzz import process, fuzz
+from .tokens import Token, TokenStream, IN_LEXICON
+from .replacer import MultiReplacer
+from .lattice import Lattice, Segment
+
+# Bump whenever a rule change alters outputs; cached results (src/cache.py) are keyed on it
+RULES_VERSION = '3'
 
 # ==================== EMAIL FIXES ====================
 
+EMAIL_TYPOS = {
+    'yahooo': 'yahoo',
+    'gmial': 'gmail',
+    'outlok': 'outlook',
+}
+EMAIL_TYPO_REPLACER = MultiReplacer(EMAIL_TYPOS)
+EMAIL_CHARS_RE = re.compile(r'[\w\.-]+\Z')
+
 def fix_email_spacing(text: str) -> str:
     """
     Fix common email spacing issues:
@@ -18,13 +32,7 @@ def fix_email_spacing(text: str) -> str:
     text = re.sub(r'@(\w+)(com|org|in|net)\b', r'@\1.\2', text, flags=re.IGNORECASE)
     
     # Pattern 3: Fix common typos
-    typo_map = {
-        'yahooo': 'yahoo',
-        'gmial': 'gmail',
-        'outlok': 'outlook',
-    }
-    for typo, correct in typo_map.items():
-        text = re.sub(rf'\b{typo}\b', correct, text, flags=re.IGNORECASE)
+    text = EMAIL_TYPO_REPLACER.replace(text)
     
     # Pattern 4: Remove spaces around @ and . in email contexts
     # Find email-like patterns and remove spaces
@@ -44,35 +52,103 @@ def fix_email_spacing(text: str) -> str:
     
     return text
 
+def fix_email_spacing_stream(ts: TokenStream) -> TokenStream:
+    """
+    Token-stream version of fix_email_spacing.
+    Only the windows around '@' / 'mail...' tokens are serialized and rewritten;
+    every other token just gets the typo fix.
+    """
+    toks = ts.tokens
+    n = len(toks)
+    windows = []
+    i = 0
+    while i < n:
+        low = toks[i].text.lower()
+        if '@' in low or low.startswith('mail'):
+            # A match can start one token to the left and runs right over
+            # email-like tokens, ending inside the first token that is not.
+            start = max(i - 1, 0)
+            j = i + 1
+            while j < n and EMAIL_CHARS_RE.match(toks[j].text):
+                j += 1
+            end = min(j + 1, n)
+            if windows and start <= windows[-1][1]:
+                windows[-1][1] = max(windows[-1][1], end)
+            else:
+                windows.append([start, end])
+            i = j
+        else:
+            i += 1
+
+    # Typos outside the windows are token-local
+    w = 0
+    for k, t in enumerate(toks):
+        while w < len(windows) and windows[w][1] <= k:
+            w += 1
+        if w < len(windows) and windows[w][0] <= k:
+            continue
+        fixed = EMAIL_TYPO_REPLACER.replace(t.text)
+        if fixed is not t.text:
+            t.set(fixed)
+
+    for start, end in reversed(windows):
+        chunk = ' '.join([t.text for t in toks[start:end]])
+        fixed = fix_email_spacing(chunk)
+        if fixed != chunk:
+            ts.splice(start, end, fixed)
+    return ts
+
 EMAIL_TOKEN_PATTERNS = [
     (r'\b\(?(at|@)\)?\b', '@'),
     (r'\b(dot)\b', '.'),
     (r'\s*@\s*', '@'),
     (r'\s*\.\s*', '.')
 ]
+# Token-local part of EMAIL_TOKEN_PATTERNS; the whitespace patterns become a glue pass
+EMAIL_WORD_RES = [(re.compile(pat, re.IGNORECASE), rep) for pat, rep in EMAIL_TOKEN_PATTERNS[:2]]
 
-def collapse_spelled_letters(s: str) -> str:
-    """Collapse sequences like 'g m a i l' -> 'gmail'"""
-    tokens = s.split()
+def collapse_spelled_letters_stream(ts: TokenStream) -> TokenStream:
+    """Collapse runs of five single-letter tokens into one token"""
+    toks = ts.tokens
     out = []
     i = 0
-    while i < len(tokens):
+    while i < len(toks):
         # lookahead for sequences of single letters
-        if i+4 < len(tokens) and all(len(t)==1 for t in tokens[i:i+5]):
-            out.append(''.join(tokens[i:i+5]))
+        if i+4 < len(toks) and all(len(t.text)==1 for t in toks[i:i+5]):
+            head = toks[i]
+            for t in toks[i+1:i+5]:
+                head.absorb(t)
+            out.append(head)
             i += 5
         else:
-            out.append(tokens[i])
+            out.append(toks[i])
             i += 1
-    return ' '.join(out)
+    ts.tokens = out
+    return ts
+
+def collapse_spelled_letters(s: str) -> str:
+    """Collapse sequences like 'g m a i l' -> 'gmail'"""
+    return collapse_spelled_letters_stream(TokenStream.from_text(s)).text()
+
+def normalize_email_stream(ts: TokenStream) -> TokenStream:
+    collapse_spelled_letters_stream(ts)
+    out = []
+    for t in ts.tokens:
+        text = t.text
+        for rx, rep in EMAIL_WORD_RES:
+            text = rx.sub(rep, text)
+        if text is not t.text:
+            t.set(text)
+        # '\s*@\s*' and '\s*\.\s*': glue tokens around '@' and '.'
+        if out and (out[-1].text.endswith(('@', '.')) or text.startswith(('@', '.'))):
+            out[-1].absorb(t)
+        else:
+            out.append(t)
+    ts.tokens = out
+    return fix_email_spacing_stream(ts)
 
 def normalize_email_tokens(s: str) -> str:
-    s2 = s
-    s2 = collapse_spelled_letters(s2)
-    for pat, rep in EMAIL_TOKEN_PATTERNS:
-        s2 = re.sub(pat, rep, s2, flags=re.IGNORECASE)
-    s2 = fix_email_spacing(s2)
-    return s2
+    return normalize_email_stream(TokenStream.from_text(s)).text()
 
 # ==================== NUMBER HANDLING ====================
 
@@ -101,32 +177,67 @@ def words_to_digits(seq: List[str]) -> str:
             i += 1
     return ''.join(out)
 
-def normalize_numbers_spoken(s: str) -> str:
-    """Replace simple spoken digit sequences with digits"""
-    tokens = s.split()
+NUM_PREFIX = ('double', 'triple')
+
+def normalize_numbers_stream(ts: TokenStream) -> TokenStream:
+    """Replace runs of spoken digit tokens with a single digit token"""
+    toks = ts.tokens
     out = []
     i = 0
-    while i < len(tokens):
+    while i < len(toks):
         # Check for number words in a small window
-        window = []
         j = i
-        while j < len(tokens) and j < i+8:
-            if tokens[j].lower() in NUM_WORD or tokens[j].lower() in ('double', 'triple'):
-                window.append(tokens[j])
+        while j < len(toks) and j < i+8:
+            low = toks[j].text.lower()
+            if low in NUM_WORD or low in NUM_PREFIX:
                 j += 1
             else:
                 break
         
-        if len(window) >= 1:
-            wd = words_to_digits(window)
+        if j > i:
+            wd = words_to_digits([t.text for t in toks[i:j]])
             if len(wd) >= 1:
-                out.append(wd)
+                head = toks[i]
+                head.set(wd)
+                head.end = toks[j-1].end
+                out.append(head)
                 i = j
                 continue
         
-        out.append(tokens[i])
+        out.append(toks[i])
         i += 1
-    return ' '.join(out)
+    ts.tokens = out
+    return ts
+
+def normalize_numbers_spoken(s: str) -> str:
+    """Replace simple spoken digit sequences with digits"""
+    return normalize_numbers_stream(TokenStream.from_text(s)).text()
+
+def indian_group(num_str: str) -> str:
+    """Format number with Indian grouping (last 3, then every 2)"""
+    num_str = re.sub('[^0-9]', '', num_str)
+    if not num_str or len(num_str) <= 3:
+        return num_str
+    
+    x = num_str
+    last3 = x[-3:]
+    rest = x[:-3]
+    parts = []
+    while len(rest) > 2:
+        parts.insert(0, rest[-2:])
+        rest = rest[:-2]
+    if rest:
+        parts.insert(0, rest)
+    return ','.join(parts + [last3])
+
+def _rupee_repl(m):
+    raw = re.sub('[^0-9]', '', m.group(0))
+    if not raw:
+        return m.group(0)
+    return '₹' + indian_group(raw)
+
+RUPEE_AMOUNT_RE = re.compile(r'₹\s*[0-9][0-9,\.]*')
+CURRENCY_WORD_RE = re.compile(r'\b(?:rs|rupees)\Z', re.IGNORECASE)
 
 def normalize_currency(s: str) -> str:
     """
@@ -139,143 +250,242 @@ def normalize_currency(s: str) -> str:
     s = re.sub(r'\brs\s+', '₹', s, flags=re.IGNORECASE)
     s = re.sub(r'\brupees\s+', '₹', s, flags=re.IGNORECASE)
     
-    # Ensure proper formatting: ₹ followed by number
-    def indian_group(num_str):
-        """Format number with Indian grouping (last 3, then every 2)"""
-        num_str = re.sub('[^0-9]', '', num_str)
-        if not num_str or len(num_str) <= 3:
-            return num_str
-        
-        x = num_str
-        last3 = x[-3:]
-        rest = x[:-3]
-        parts = []
-        while len(rest) > 2:
-            parts.insert(0, rest[-2:])
-            rest = rest[:-2]
-        if rest:
-            parts.insert(0, rest)
-        return ','.join(parts + [last3])
-    
-    def repl(m):
-        raw = re.sub('[^0-9]', '', m.group(0))
-        if not raw:
-            return m.group(0)
-        return '₹' + indian_group(raw)
-    
     # Fix existing ₹ with numbers
-    s = re.sub(r'₹\s*[0-9][0-9,\.]*', repl, s)
+    s = RUPEE_AMOUNT_RE.sub(_rupee_repl, s)
     
     return s
 
+def normalize_currency_stream(ts: TokenStream) -> TokenStream:
+    """Token-stream version of normalize_currency"""
+    toks = ts.tokens
+    i = 0
+    while i < len(toks):
+        t = toks[i]
+        # 'rs 500' / 'rupees 500' -> '₹500' (the word is glued to the next token)
+        m = CURRENCY_WORD_RE.search(t.text)
+        while m and i+1 < len(toks):
+            t.set(t.text[:m.start()] + '₹')
+            t.absorb(toks.pop(i+1))
+            m = CURRENCY_WORD_RE.search(t.text)
+        if '₹' in t.text:
+            # '₹ 500' -> '₹500'
+            while t.text.endswith('₹') and i+1 < len(toks) and '0' <= toks[i+1].text[0] <= '9':
+                t.absorb(toks.pop(i+1))
+            t.set(RUPEE_AMOUNT_RE.sub(_rupee_repl, t.text))
+        i += 1
+    return ts
+
 # ==================== TEXT NORMALIZATION ====================
 
-def normalize_text(s: str) -> str:
+# Common abbreviation expansions and spelling fixes (word-bounded, case-insensitive)
+TEXT_REPLACEMENTS = {
+    'pls': 'please',
+    'u': 'you',
+    'ur': 'your',
+    'im': "I'm",
+    'adress': 'address',
+    'ofer': 'offer',
+    'ofering': 'offering',
+    'lets': "let's",
+    'counteroffer': 'Counter-offer',
+    'counter offer': 'Counter-offer',
+}
+# Built-in tables merged under data/misspell_map.json (see replacer.MisspellReplacer)
+BUILTIN_REPLACEMENTS = {**TEXT_REPLACEMENTS, **EMAIL_TYPOS}
+DEFAULT_REPLACER = MultiReplacer(BUILTIN_REPLACEMENTS)
+
+def normalize_text(s: str, replacer=None) -> str:
     """
     Fix common speech-to-text errors:
     - Capitalization
     - Common abbreviations (pls, u, im)
     - Spelling errors
+    All replacements are applied in a single pass by `replacer`
+    (DEFAULT_REPLACER, or a MisspellReplacer that also loads the misspelling map).
     """
-    # Common abbreviation expansions
-    replacements = {
-        r'\bpls\b': 'please',
-        r'\bu\b': 'you',
-        r'\bur\b': 'your',
-        r'\bim\b': "I'm",
-        r'\badress\b': 'address',
-        r'\bofer\b': 'offer',
-        r'\bofering\b': 'offering',
-        r'\blets\b': "let's",
-    }
-    
-    for pattern, replacement in replacements.items():
-        s = re.sub(pattern, replacement, s, flags=re.IGNORECASE)
+    s = (replacer if replacer is not None else DEFAULT_REPLACER).replace(s)
     
     # Capitalize first letter of sentence
     if s and s[0].islower():
         s = s[0].upper() + s[1:]
     
-    # Fix 'counteroffer' -> 'Counter-offer'
-    s = re.sub(r'\bcounteroffer\b', 'Counter-offer', s, flags=re.IGNORECASE)
-    s = re.sub(r'\bcounter offer\b', 'Counter-offer', s, flags=re.IGNORECASE)
-    
     return s
 
+LEADING_NAME_COMMA_RE = re.compile(r'^([A-Z][a-z]+)\s+([a-z])')
+# Only matches from the start of a whitespace run: trying every start inside a
+# long run that is not followed by punctuation would rescan the rest of it
+SPACE_BEFORE_PUNCT_RE = re.compile(r'(?<!\s)\s+([.,!?])')
+
 def add_punctuation(s: str) -> str:
     """Add basic punctuation: commas after greetings, period at end"""
     # Add comma after name at start (e.g., "Ansh please" -> "Ansh, please")
     # Match capitalized word at start followed by lowercase word
-    s = re.sub(r'^([A-Z][a-z]+)\s+([a-z])', r'\1, \2', s)
+    s = LEADING_NAME_COMMA_RE.sub(r'\1, \2', s)
     
     # Add period at end if missing
     if s and s[-1] not in '.!?':
         s += '.'
     
     # Fix space before punctuation
-    s = re.sub(r'\s+([.,!?])', r'\1', s)
+    s = SPACE_BEFORE_PUNCT_RE.sub(r'\1', s)
     
     return s
 
+LEADING_NAME_RE = re.compile(r'[A-Z][a-z]+\Z')
+
+def add_punctuation_stream(ts: TokenStream) -> TokenStream:
+    """Token-stream version of add_punctuation"""
+    toks = ts.tokens
+    if not toks:
+        if ts.source:
+            toks.append(Token('.', 0, len(ts.source)))
+        return ts
+    # Add comma after name at start (e.g., "Ansh please" -> "Ansh, please")
+    if len(toks) > 1 and LEADING_NAME_RE.match(toks[0].text) and 'a' <= toks[1].text[0] <= 'z':
+        toks[0].set(toks[0].text + ',')
+    
+    # Add period at end if missing
+    if toks[-1].text[-1] not in '.!?':
+        toks[-1].set(toks[-1].text + '.')
+    
+    # Fix space before punctuation
+    out = [toks[0]]
+    for t in toks[1:]:
+        if t.text[0] in '.,!?':
+            out[-1].absorb(t)
+        else:
+            out.append(t)
+    ts.tokens = out
+    return ts
+
+def correct_names_stream(ts: TokenStream, names_lex: List[str], threshold: int = 85) -> TokenStream:
+    """Token-stream version of correct_names_with_lexicon; matched tokens are flagged IN_LEXICON"""
+    lex = set(names_lex)
+    prev = None
+    for t in ts.tokens:
+        text = t.text
+        # Only check tokens that look like they could be names (start with capital or all lowercase)
+        if len(text) > 2 and (t.is_capitalized or text.islower()):
+            if text in lex:
+                # An exact entry is always its own best match
+                t.flags |= IN_LEXICON
+            else:
+                best = process.extractOne(text, names_lex, scorer=fuzz.ratio)
+                if best and best[1] >= threshold:
+                    t.set(best[0])
+                    t.flags |= IN_LEXICON
+                # Capitalize if it looks like a name (at start or after comma)
+                elif prev is None or prev.text.endswith(','):
+                    t.set(text.capitalize())
+        prev = t
+    return ts
+
 def correct_names_with_lexicon(s: str, names_lex: List[str], threshold: int = 85) -> str:
     """
     Correct names using fuzzy matching against lexicon.
     Lower threshold from 90 to 85 for better recall.
     """
-    tokens = s.split()
-    out = []
-    for t in tokens:
-        # Only check tokens that look like they could be names (start with capital or all lowercase)
-        if len(t) > 2 and (t[0].isupper() or t.islower()):
-            best = process.extractOne(t, names_lex, scorer=fuzz.ratio)
-            if best and best[1] >= threshold:
-                out.append(best[0])
-            else:
-                # Capitalize if it looks like a name (at start or after comma)
-                if len(out) == 0 or (len(out) > 0 and out[-1].endswith(',')):
-                    out.append(t.capitalize())
-                else:
-                    out.append(t)
-        else:
-            out.append(t)
-    return ' '.join(out)
+    return correct_names_stream(TokenStream.from_text(s), names_lex, threshold).text()
 
 # ==================== CANDIDATE GENERATION ====================
 
-def generate_candidates(text: str, names_lex: List[str]) -> List[str]:
+def generate_candidates(text: str, names_lex: List[str], replacer=None) -> List[str]:
     """
     Generate candidate corrections. 
     OPTIMIZATION: Limit to 3 best candidates for speed.
+    The candidates share one normalize_text pass and one tokenization; each
+    is serialized back to text once, after its last stage.
     """
     cands = set()
-    
-    # Candidate 1: Full pipeline
-    t1 = text
-    t1 = normalize_text(t1)
-    t1 = normalize_email_tokens(t1)
-    t1 = normalize_numbers_spoken(t1)
-    t1 = normalize_currency(t1)
-    t1 = correct_names_with_lexicon(t1, names_lex)
-    t1 = add_punctuation(t1)
-    cands.add(t1)
+    base = TokenStream.from_text(normalize_text(text, replacer))
     
     # Candidate 2: Email + punctuation focus
-    t2 = text
-    t2 = normalize_text(t2)
-    t2 = normalize_email_tokens(t2)
-    t2 = add_punctuation(t2)
-    cands.add(t2)
+    email = normalize_email_stream(base.copy())
+    
+    # Candidate 1: Full pipeline (continues from candidate 2's email stage)
+    t1 = email.copy()
+    normalize_numbers_stream(t1)
+    normalize_currency_stream(t1)
+    correct_names_stream(t1, names_lex)
+    add_punctuation_stream(t1)
+    cands.add(t1.text())
+    
+    cands.add(add_punctuation_stream(email).text())
     
     # Candidate 3: Original with minimal fixes
-    t3 = text
-    t3 = normalize_text(t3)
-    t3 = fix_email_spacing(t3)
-    t3 = add_punctuation(t3)
-    cands.add(t3)
+    t3 = fix_email_spacing_stream(base)
+    add_punctuation_stream(t3)
+    cands.add(t3.text())
     
     # Deduplicate and limit to 3 for speed
     out = list(cands)
     # Sort by length (prefer complete transformations)
     out = sorted(out, key=lambda x: -len(x))[:3]
     
-    return out
\ No newline at end of file
+    return out
+
+def _segment_texts(ts: TokenStream, cuts: List[int]) -> List[str]:
+    """Text of `ts` between consecutive cut points (tokens never straddle a cut)."""
+    out = [[] for _ in range(len(cuts) - 1)]
+    k = 0
+    for t in ts.tokens:
+        while cuts[k + 1] < t.end:
+            k += 1
+        out[k].append(t.text)
+    return [' '.join(x) for x in out]
+
+def build_lattice(text: str, names_lex: List[str], replacer=None) -> Lattice:
+    """
+    Build a candidate lattice instead of whole-sentence candidates.
+    The stage outputs (email normalization, numbers+currency, names, and the
+    same number/name stages on top of the minimal email fix) are aligned on
+    the source offsets of their tokens; wherever they disagree, the span
+    becomes an uncertain segment carrying every distinct form (full pipeline
+    first). A sentence-initial name also gets a comma slot.
+    """
+    base = TokenStream.from_text(normalize_text(text, replacer))
+    minimal = fix_email_spacing_stream(base.copy())
+    email = normalize_email_stream(base.copy())
+    numbers = normalize_currency_stream(normalize_numbers_stream(email.copy()))
+    full = correct_names_stream(numbers.copy(), names_lex)
+    minimal_numbers = normalize_currency_stream(normalize_numbers_stream(minimal.copy()))
+    minimal_full = correct_names_stream(minimal_numbers, names_lex)
+    streams = (full, minimal_full, numbers, email, minimal)
+
+    if not full.tokens:
+        return Lattice([], base.source)
+
+    cuts = None
+    for ts in streams:
+        b = {t.start for t in ts.tokens} | {t.end for t in ts.tokens}
+        cuts = b if cuts is None else cuts & b
+    cuts = sorted(cuts)
+    texts = [_segment_texts(ts, cuts) for ts in streams]
+
+    segments = []
+    for f, mf, n, e, m in zip(*texts):
+        if not (f or mf or n or e or m):
+            continue
+        alts = []
+        for x in (f, mf, n, e, m):
+            x = re.sub(r'\s+([.,!?])', r'\1', x)
+            if x and x not in alts:
+                alts.append(x)
+        if len(alts) == 1:
+            kind = 'fixed'
+        elif e != m:
+            kind = 'email'
+        elif n != e:
+            kind = 'number'
+        else:
+            kind = 'name'
+        segments.append(Segment(alts, kind))
+
+    # Comma after a leading name ("Ansh please" -> "Ansh, please")
+    first = full.tokens[0]
+    unpunctuated = all(a[-1] not in '.,!?:' for a in segments[0].alts)
+    if len(full.tokens) > 1 and first.end == cuts[1] and unpunctuated:
+        rule = bool(LEADING_NAME_RE.match(first.text)) and 'a' <= full.tokens[1].text[0] <= 'z'
+        if rule or first.in_lexicon:
+            segments.insert(1, Segment([',', ''] if rule else ['', ','], 'comma'))
+    return Lattice(segments, base.source)
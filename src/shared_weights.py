@@ -0,0 +1,50 @@
+import mmap
+import os
+
+try:
+    import onnx  # type: ignore
+    from onnx import external_data_helper
+except Exception:
+    onnx = None
+
+# External tensors start on a page boundary so each one maps onto whole pages
+PAGE = mmap.ALLOCATIONGRANULARITY
+
+
+def externalize(in_path: str, out_path: str, size_threshold: int = 1024):
+    """
+    Re-save an ONNX model with its large initializers in one page-aligned external
+    file (<out_path>.data). Small tensors stay inline (shape inference needs them).
+    Models saved this way can be loaded with share_weights=True.
+    """
+    if onnx is None:
+        raise RuntimeError("onnx is required to re-save a model with external weights")
+    model = onnx.load(in_path)
+    location = os.path.basename(out_path) + ".data"
+    data_path = os.path.join(os.path.dirname(os.path.abspath(out_path)), location)
+    offset = 0
+    with open(data_path, "wb") as f:
+        for t in model.graph.initializer:
+            if not t.HasField("raw_data") or len(t.raw_data) < size_threshold:
+                continue
+            n = len(t.raw_data)
+            offset = -(-offset // PAGE) * PAGE
+            f.seek(offset)
+            f.write(t.raw_data)
+            external_data_helper.set_external_data(t, location, offset, n)
+            t.ClearField("raw_data")
+            t.data_location = onnx.TensorProto.EXTERNAL
+            offset += n
+    onnx.save_model(model, out_path)
+
+
+def external_weight_bytes(onnx_path: str) -> int:
+    """Total size of the initializers `onnx_path` keeps in external files"""
+    if onnx is None:
+        raise RuntimeError("onnx is required for share_weights=True")
+    model = onnx.load(onnx_path, load_external_data=False)
+    total = 0
+    for t in model.graph.initializer:
+        if t.data_location == onnx.TensorProto.EXTERNAL:
+            total += int({kv.key: kv.value for kv in t.external_data}.get("length", 0))
+    return total
@@ -0,0 +1,267 @@
+import gzip
+import json
+import random
+import re
+from typing import Dict, Iterator, List, Tuple
+
+from .rules import indian_group
+from .utils import EMAIL_RE
+
+# Synthetic parallel data: gold sentences become templates with {name}/{email}/{amount}
+# slots, which are refilled at random; noise models then turn each gold line into a
+# plausible ASR transcript. Record i depends only on (seed, i), so output is
+# reproducible and shards can be generated independently.
+
+SURNAMES = ['mehta', 'sharma', 'iyer', 'reddy', 'nair', 'gupta', 'rao', 'patel', 'singh', 'das']
+DOMAINS = ['gmail.com', 'yahoo.com', 'outlook.com', 'hotmail.com']
+AMOUNT_RE = re.compile(r'₹\d[\d,]*')
+NAME_RE = re.compile(r'\b[A-Z][a-z]+\b')
+WORD_RE = re.compile(r"[A-Za-z][A-Za-z'-]*")
+PUNCT_RE = re.compile(r'\s*[—–]\s*|[.,?!:;](?=\s|$)')
+
+DIGIT_WORDS = ['zero', 'one', 'two', 'three', 'four', 'five', 'six', 'seven', 'eight', 'nine']
+TEENS = ['ten', 'eleven', 'twelve', 'thirteen', 'fourteen', 'fifteen', 'sixteen', 'seventeen', 'eighteen', 'nineteen']
+TENS = ['', '', 'twenty', 'thirty', 'forty', 'fifty', 'sixty', 'seventy', 'eighty', 'ninety']
+
+# Probability that each noise model fires on a record
+DEFAULT_NOISE = {
+    'email': 0.8,      # spoken / mangled email addresses
+    'numbers': 0.7,    # spoken Indian amounts
+    'punct': 0.8,      # dropped punctuation and casing
+    'names': 0.4,      # lowercased or misspelled names
+    'misspell': 0.3,   # common misspellings (inverse of the misspelling map)
+    'length': 0.05,    # several sentences joined into one long utterance
+}
+
+
+def parse_noise(spec: str) -> Dict[str, float]:
+    """'email=0.5,length=0.2' -> DEFAULT_NOISE with those entries overridden"""
+    noise = dict(DEFAULT_NOISE)
+    for part in filter(None, (p.strip() for p in (spec or '').split(','))):
+        key, _, val = part.partition('=')
+        if key not in DEFAULT_NOISE:
+            raise ValueError(f"unknown noise model {key!r}; expected one of {sorted(DEFAULT_NOISE)}")
+        noise[key] = float(val)
+    return noise
+
+
+def build_templates(golds: List[str], names_lex: List[str]) -> List[str]:
+    """Distinct gold sentences with entities replaced by {email}, {amount} and {name} slots"""
+    names = {n for n in names_lex if ' ' not in n}
+    out = []
+    seen = set()
+    for g in golds:
+        t = g.replace('{', '{{').replace('}', '}}')
+        t = EMAIL_RE.sub('{email}', t)
+        t = AMOUNT_RE.sub('{amount}', t)
+        t = NAME_RE.sub(lambda m: '{name}' if m.group(0) in names else m.group(0), t)
+        if t not in seen:
+            seen.add(t)
+            out.append(t)
+    return out
+
+
+def below_hundred(n: int) -> str:
+    if n < 10:
+        return DIGIT_WORDS[n]
+    if n < 20:
+        return TEENS[n - 10]
+    return TENS[n // 10] + ('' if n % 10 == 0 else ' ' + DIGIT_WORDS[n % 10])
+
+
+def indian_words(n: int) -> str:
+    """149800 -> 'one lakh forty nine thousand eight hundred'"""
+    if n == 0:
+        return 'zero'
+    parts = []
+    for size, word in ((10 ** 7, 'crore'), (10 ** 5, 'lakh'), (1000, 'thousand'), (100, 'hundred')):
+        if n >= size:
+            parts.append(f"{indian_words(n // size) if size == 10 ** 7 else below_hundred(n // size)} {word}")
+            n %= size
+    if n:
+        parts.append(below_hundred(n))
+    return ' '.join(parts)
+
+
+def spoken_digits(digits: str, rng: random.Random) -> str:
+    """'999' -> 'nine nine nine' or 'nine double nine' / 'triple nine'"""
+    out = []
+    i = 0
+    while i < len(digits):
+        j = i
+        while j < len(digits) and digits[j] == digits[i]:
+            j += 1
+        run = j - i
+        word = DIGIT_WORDS[int(digits[i])]
+        if run >= 3 and rng.random() < 0.5:
+            out.append(f"triple {word}")
+            i += 3
+        elif run >= 2 and rng.random() < 0.5:
+            out.append(f"double {word}")
+            i += 2
+        else:
+            out.append(word)
+            i += 1
+    return ' '.join(out)
+
+
+def noisy_amount(n: int, rng: random.Random) -> str:
+    r = rng.random()
+    if r < 0.3 and n < 10000:
+        return spoken_digits(str(n), rng)
+    if r < 0.5:
+        return indian_words(n)
+    if r < 0.7:
+        return f"rs {indian_group(str(n))}"
+    if r < 0.85:
+        return f"rupees {n}"
+    return f"₹{n}"
+
+
+def noisy_email(email: str, rng: random.Random) -> str:
+    local, _, domain = email.partition('@')
+    host, _, tld = domain.rpartition('.')
+    r = rng.random()
+    if r < 0.35:
+        # Fully spoken
+        return f"{local.replace('.', ' dot ')} at {host} dot {tld}"
+    if r < 0.6:
+        # Dots dropped, as ASR often emits it
+        return f"{local.replace('.', '')}@{host}{tld}"
+    if r < 0.8:
+        # Split provider name
+        host = {'gmail': 'g mail', 'hotmail': 'hot mail'}.get(host, host)
+        return f"{local}@{host}.{tld}"
+    typo = {'yahoo': 'yahooo', 'gmail': 'gmial', 'outlook': 'outlok'}.get(host, host)
+    return f"{local}@{typo}.{tld}"
+
+
+def misspell_name(name: str, rng: random.Random) -> str:
+    low = name.lower()
+    if len(low) < 4 or rng.random() < 0.5:
+        return low
+    i = rng.randrange(1, len(low) - 1)
+    op = rng.random()
+    if op < 0.4:
+        return low[:i] + low[i + 1:]                  # drop a letter
+    if op < 0.7:
+        return low[:i] + low[i] + low[i:]             # double a letter
+    return low[:i - 1] + low[i] + low[i - 1] + low[i + 1:]  # swap two letters
+
+
+class Synthesizer:
+    """Turns gold templates into (noisy, gold) pairs under the configured noise models"""
+
+    def __init__(self, golds: List[str], names_lex: List[str], misspell_map: Dict[str, str],
+                 noise: Dict[str, float] = None, seed: int = 0, max_extend: int = 8):
+        self.templates = build_templates(golds, names_lex)
+        if not self.templates:
+            raise ValueError("no gold sentences to build templates from")
+        self.names = [n for n in names_lex if ' ' not in n]
+        # correct word -> misspellings (the correction must be a single word, e.g. 'counter-offer')
+        self.misspellings = {}
+        for wrong, right in misspell_map.items():
+            if WORD_RE.fullmatch(right):
+                self.misspellings.setdefault(right.lower(), []).append(wrong)
+        self.noise = dict(noise or DEFAULT_NOISE)
+        self.seed = seed
+        self.max_extend = max_extend
+
+    def _sentence(self, rng: random.Random) -> Tuple[str, str]:
+        noise = self.noise
+        template = rng.choice(self.templates)
+        parts = re.split(r'(\{name\}|\{email\}|\{amount\})', template.replace('{{', '\0').replace('}}', '\1'))
+        gold, noisy = [], []
+        use = {k: rng.random() < p for k, p in noise.items()}
+        for part in parts:
+            if part == '{name}':
+                name = rng.choice(self.names)
+                gold.append(name)
+                noisy.append(misspell_name(name, rng) if use['names'] else name)
+            elif part == '{email}':
+                email = f"{rng.choice(self.names).lower()}.{rng.choice(SURNAMES)}@{rng.choice(DOMAINS)}"
+                gold.append(email)
+                noisy.append(noisy_email(email, rng) if use['email'] else email)
+            elif part == '{amount}':
+                # Log-uniform amounts between ~100 and ~10 lakh
+                n = int(round(10 ** rng.uniform(2, 6), -1)) - rng.choice((0, 1))
+                gold.append(f"₹{indian_group(str(n))}")
+                noisy.append(noisy_amount(n, rng) if use['numbers'] else gold[-1])
+            else:
+                part = part.replace('\0', '{').replace('\1', '}')
+                gold.append(part)
+                if use['misspell'] and self.misspellings:
+                    part = WORD_RE.sub(lambda m: self._misspell(m.group(0), rng), part)
+                noisy.append(part)
+        g, s = ''.join(gold), ''.join(noisy)
+        if use['punct']:
+            s = PUNCT_RE.sub(lambda m: ' ' if m.group(0).strip() in '—–' else '', s)
+            s = ' '.join(s.split())
+            if rng.random() < 0.5:
+                s = s[:1].lower() + s[1:]
+        return s, g
+
+    def _misspell(self, word: str, rng: random.Random) -> str:
+        options = self.misspellings.get(word.lower())
+        if not options or rng.random() < 0.5:
+            return word
+        return rng.choice(options)
+
+    def pair(self, i: int) -> Tuple[str, str]:
+        """The (noisy, gold) pair for record i"""
+        rng = random.Random(f"{self.seed}:{i}")
+        noisy, gold = self._sentence(rng)
+        if rng.random() < self.noise['length']:
+            for _ in range(rng.randint(1, self.max_extend)):
+                n2, g2 = self._sentence(rng)
+                noisy, gold = f"{noisy} {n2}", f"{gold} {g2}"
+        return noisy, gold
+
+    def generate(self, n: int, start: int = 0) -> Iterator[Tuple[int, str, str]]:
+        for i in range(start, start + n):
+            yield (i,) + self.pair(i)
+
+
+def _open(path: str):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'wt', encoding='utf-8')
+    return open(path, 'w', encoding='utf-8')
+
+
+def write_pairs(synth: Synthesizer, n: int, noisy_path: str, gold_path: str, start: int = 0) -> int:
+    """Stream n records to parallel JSONL files (same shape as data/noisy_transcripts.jsonl / data/gold.jsonl)"""
+    count = 0
+    with _open(noisy_path) as fn, _open(gold_path) as fg:
+        for i, noisy, gold in synth.generate(n, start):
+            fn.write(json.dumps({"id": i, "text": noisy}, ensure_ascii=False) + "\n")
+            fg.write(json.dumps({"id": i, "text": gold}, ensure_ascii=False) + "\n")
+            count += 1
+    return count
+
+
+if __name__ == "__main__":
+    import argparse, os, time
+    ap = argparse.ArgumentParser(description="Generate synthetic noisy/gold transcript pairs")
+    ap.add_argument("--gold", default="data/gold.jsonl")
+    ap.add_argument("--names", default="data/names_lexicon.txt")
+    ap.add_argument("--misspell", default="data/misspell_map.json")
+    ap.add_argument("--n", type=int, default=100000)
+    ap.add_argument("--start", type=int, default=0, help="first record id (for sharded generation)")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--noise", default="", help="override noise probabilities, e.g. 'email=0.5,length=0.2'")
+    ap.add_argument("--max_extend", type=int, default=8, help="max extra sentences joined by the length model")
+    ap.add_argument("--out_dir", default="out/synth")
+    ap.add_argument("--gzip", action="store_true")
+    args = ap.parse_args()
+
+    golds = [json.loads(line)["text"] for line in open(args.gold, 'r', encoding='utf-8')]
+    names_lex = [x.strip() for x in open(args.names, 'r', encoding='utf-8') if x.strip()]
+    with open(args.misspell, 'r', encoding='utf-8') as f:
+        misspell_map = json.load(f)
+    synth = Synthesizer(golds, names_lex, misspell_map, parse_noise(args.noise), args.seed, args.max_extend)
+    os.makedirs(args.out_dir, exist_ok=True)
+    ext = ".jsonl.gz" if args.gzip else ".jsonl"
+    t0 = time.perf_counter()
+    n = write_pairs(synth, args.n, os.path.join(args.out_dir, "noisy" + ext), os.path.join(args.out_dir, "gold" + ext), args.start)
+    dt = time.perf_counter() - t0
+    print(f"{n} pairs from {len(synth.templates)} templates -> {args.out_dir} ({n / dt:.0f} pairs/s)")
@@ -0,0 +1,115 @@
+from typing import List
+
+# Token flag bits (see Token.flags)
+IS_DIGIT = 1
+IS_CAPITALIZED = 2
+IN_LEXICON = 4
+
+
+class Token:
+    """
+    A single whitespace-delimited token.
+    - text: current surface form (rule stages rewrite it in place)
+    - start/end: character span in the source text the token came from
+    - flags: bitmask of IS_DIGIT / IS_CAPITALIZED / IN_LEXICON
+    """
+    __slots__ = ('text', 'start', 'end', 'flags')
+
+    def __init__(self, text: str, start: int = 0, end: int = 0, flags: int = 0):
+        self.text = text
+        self.start = start
+        self.end = end
+        self.flags = flags | _shape_flags(text)
+
+    def set(self, text: str):
+        """Rewrite the token text and refresh its shape flags (IN_LEXICON is kept)."""
+        self.text = text
+        self.flags = (self.flags & IN_LEXICON) | _shape_flags(text)
+
+    def absorb(self, other: 'Token', sep: str = ''):
+        """Append another token to this one, widening the source span."""
+        self.set(self.text + sep + other.text)
+        self.end = max(self.end, other.end)
+
+    @property
+    def is_digit(self) -> bool:
+        return bool(self.flags & IS_DIGIT)
+
+    @property
+    def is_capitalized(self) -> bool:
+        return bool(self.flags & IS_CAPITALIZED)
+
+    @property
+    def in_lexicon(self) -> bool:
+        return bool(self.flags & IN_LEXICON)
+
+    def copy(self) -> 'Token':
+        t = Token.__new__(Token)
+        t.text, t.start, t.end, t.flags = self.text, self.start, self.end, self.flags
+        return t
+
+    def __repr__(self):
+        return f"Token({self.text!r}, {self.start}, {self.end}, flags={self.flags})"
+
+
+def _shape_flags(text: str) -> int:
+    f = 0
+    if text.isdigit():
+        f |= IS_DIGIT
+    if text[:1].isupper():
+        f |= IS_CAPITALIZED
+    return f
+
+
+class TokenStream:
+    """
+    Shared token representation for the rule stages.
+    The source text is split once; stages mutate the token list in place and
+    the stream is serialized back to text once, at the end of a candidate.
+    """
+    __slots__ = ('tokens', 'source')
+
+    def __init__(self, tokens: List[Token], source: str = ''):
+        self.tokens = tokens
+        self.source = source
+
+    @classmethod
+    def from_text(cls, text: str) -> 'TokenStream':
+        tokens = []
+        pos = 0
+        for w in text.split():
+            start = text.index(w, pos)
+            pos = start + len(w)
+            tokens.append(Token(w, start, pos))
+        return cls(tokens, text)
+
+    def copy(self) -> 'TokenStream':
+        return TokenStream([t.copy() for t in self.tokens], self.source)
+
+    def splice(self, i: int, j: int, text: str):
+        """
+        Replace tokens[i:j] with the tokens of `text`. Leading/trailing tokens that
+        come out unchanged keep their own spans; the rewritten middle spans the
+        source range of the tokens it replaced.
+        """
+        old = self.tokens[i:j]
+        words = text.split()
+        p = 0
+        while p < len(old) and p < len(words) and old[p].text == words[p]:
+            p += 1
+        q = 0
+        while q < len(old) - p and q < len(words) - p and old[-1 - q].text == words[-1 - q]:
+            q += 1
+        mid_old = old[p:len(old) - q]
+        mid = words[p:len(words) - q]
+        if mid_old:
+            start, end = mid_old[0].start, mid_old[-1].end
+        else:
+            start = end = old[p - 1].end if p else old[0].start
+        self.tokens[i + p:j - q] = [Token(w, start, end) for w in mid]
+
+    def text(self) -> str:
+        return ' '.join([t.text for t in self.tokens])
+
+    def __len__(self):
+        return len(self.tokens)
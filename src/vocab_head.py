@@ -0,0 +1,176 @@
+import json
+from typing import Iterable, List, Tuple
+
+import numpy as np
+
+try:
+    import onnx  # type: ignore
+    from onnx import numpy_helper
+except Exception:
+    onnx = None
+
+# Domain-restricted vocab head: the MLM's vocab projection is cut down to the
+# wordpieces our domain uses plus one catch-all column standing for every other
+# token, so each masked row computes K+1 logits instead of 30522. The kept ids
+# are stored in the model's metadata; the ranker maps token ids into the reduced
+# output (out-of-domain ids score as the catch-all bucket).
+#
+# Unvalidated: the catch-all logit (mean logit + log(n)) approximates the
+# dropped columns, and it has only been checked on a toy model. It stays opt-in
+# (pass the domain model as --onnx) until evaluate.py --compare_vocab_head
+# reports top-1 agreement and latency on the real DistilBERT export.
+
+METADATA_KEY = "domain_vocab"
+
+
+def domain_vocab_ids(tokenizer, texts: Iterable[str]) -> List[int]:
+    """
+    Sorted ids of every wordpiece in texts, plus the special tokens and all
+    single-character pieces (so spelled-out or unusual words still tokenize
+    into kept ids)
+    """
+    keep = set(tokenizer.all_special_ids)
+    for tok, i in tokenizer.get_vocab().items():
+        if len(tok) == 1 or (tok.startswith('##') and len(tok) == 3):
+            keep.add(i)
+    for t in texts:
+        keep.update(tokenizer(t, add_special_tokens=False)["input_ids"])
+    return sorted(keep)
+
+
+def vocab_map(keep_ids: List[int], vocab_size: int) -> np.ndarray:
+    """Full-vocab id -> column of the reduced head; ids outside keep_ids -> the catch-all column"""
+    m = np.full(vocab_size, len(keep_ids), dtype=np.int64)
+    m[np.asarray(keep_ids, dtype=np.int64)] = np.arange(len(keep_ids))
+    return m
+
+
+def model_vocab_map(metadata: dict, vocab_size: int):
+    """vocab_map for a session's custom metadata, or None for a full-vocab model"""
+    ids = metadata.get(METADATA_KEY)
+    if not ids:
+        return None
+    ids = json.loads(ids)
+    return vocab_map(ids, max(vocab_size, max(ids) + 1))
+
+
+def _projector(graph):
+    """(MatMul node, weight initializer, bias initializer or None) producing the first graph output"""
+    inits = {t.name: t for t in graph.initializer}
+    producer = {o: n for n in graph.node for o in n.output}
+    node = producer.get(graph.output[0].name)
+    bias = None
+    if node is not None and node.op_type == 'Add':
+        b = [i for i in node.input if i in inits]
+        a = [i for i in node.input if i not in inits]
+        if len(b) == 1 and len(a) == 1:
+            bias = inits[b[0]]
+            node = producer.get(a[0])
+    if node is None or node.op_type != 'MatMul':
+        raise ValueError("could not find the vocab projection (MatMul [+ bias Add]) feeding the logits output")
+    w = node.input[1]
+    if w in inits:
+        return node, numpy_helper.to_array(inits[w]), bias
+    src = producer.get(w)
+    if src is not None and src.op_type == 'Transpose' and src.input[0] in inits:
+        # Weight tied to the word embeddings: MatMul(h, Transpose(E))
+        return node, numpy_helper.to_array(inits[src.input[0]]).T, bias
+    raise ValueError(f"vocab projection weight {w!r} is not a constant")
+
+
+def restrict_head(in_path: str, out_path: str, keep_ids: List[int]) -> Tuple[int, int]:
+    """
+    Re-save an (unquantized) MLM with its vocab projection reduced to keep_ids plus
+    a catch-all column. The catch-all weight is the mean of the dropped columns and
+    its bias adds log(#dropped), a one-column stand-in for their summed probability,
+    so log-softmax over the K+1 outputs stays a normalized distribution.
+    Returns the (old, new) output width.
+    """
+    if onnx is None:
+        raise RuntimeError("onnx is required to build a domain vocab head")
+    model = onnx.load(in_path)
+    graph = model.graph
+    node, weight, bias = _projector(graph)
+    vocab = weight.shape[1]
+    keep = np.asarray(keep_ids, dtype=np.int64)
+    if keep.size == 0 or keep.max() >= vocab:
+        raise ValueError(f"keep_ids must be non-empty ids below the vocab size {vocab}")
+    rest = np.setdiff1d(np.arange(vocab), keep)
+    if rest.size == 0:
+        raise ValueError("the domain vocabulary covers the whole vocabulary; nothing to restrict")
+    b = numpy_helper.to_array(bias) if bias is not None else np.zeros(vocab, dtype=weight.dtype)
+    w_new = np.concatenate([weight[:, keep], weight[:, rest].mean(axis=1, keepdims=True)], axis=1)
+    b_new = np.concatenate([b[keep], [b[rest].mean() + np.log(len(rest))]]).astype(b.dtype)
+    if bias is None:
+        # Fold the bias into a new Add so the catch-all offset is kept
+        node.output[0], logits = node.output[0] + "_domain", node.output[0]
+        graph.node.append(onnx.helper.make_node('Add', [node.output[0], "domain_head_bias"], [logits]))
+        graph.initializer.append(numpy_helper.from_array(b_new, "domain_head_bias"))
+    else:
+        bias.CopyFrom(numpy_helper.from_array(b_new, bias.name))
+    name = "domain_head_weight"
+    graph.initializer.append(numpy_helper.from_array(np.ascontiguousarray(w_new), name))
+    node.input[1] = name
+    graph.output[0].type.tensor_type.shape.dim[-1].dim_value = w_new.shape[1]
+    # Drop initializers/nodes the old projection no longer needs (a tied embedding stays in use)
+    outputs = {o.name for o in graph.output}
+    used = {i for n in graph.node for i in n.input}
+    nodes = [n for n in graph.node if any(o in used or o in outputs for o in n.output)]
+    del graph.node[:]
+    graph.node.extend(nodes)
+    used = {i for n in graph.node for i in n.input}
+    inits = [t for t in graph.initializer if t.name in used]
+    del graph.initializer[:]
+    graph.initializer.extend(inits)
+    meta = model.metadata_props.add()
+    meta.key, meta.value = METADATA_KEY, json.dumps([int(i) for i in keep_ids])
+    onnx.checker.check_model(model)
+    onnx.save_model(model, out_path)
+    return vocab, w_new.shape[1]
+
+
+def domain_texts(corpus_paths: List[str], names_path: str, misspell_path: str = None) -> List[str]:
+    """Corpus lines, their rule candidates, the names lexicon and the rule / misspelling tables"""
+    from .rules import generate_candidates, BUILTIN_REPLACEMENTS
+    from .replacer import MisspellReplacer
+    names_lex = [x.strip() for x in open(names_path, 'r', encoding='utf-8') if x.strip()]
+    replacer = MisspellReplacer(misspell_path, BUILTIN_REPLACEMENTS)
+    texts = list(names_lex) + [n.lower() for n in names_lex]
+    for k, v in BUILTIN_REPLACEMENTS.items():
+        texts += [k, v]
+    if misspell_path:
+        with open(misspell_path, 'r', encoding='utf-8') as f:
+            for k, v in json.load(f).items():
+                texts += [k, v]
+    for path in corpus_paths:
+        for line in open(path, 'r', encoding='utf-8'):
+            line = line.strip()
+            if not line:
+                continue
+            text = json.loads(line)["text"] if path.endswith('.jsonl') else line
+            texts.append(text)
+            texts += generate_candidates(text, names_lex, replacer)
+    return texts
+
+
+if __name__ == "__main__":
+    import argparse
+    from transformers import AutoTokenizer
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+    ap = argparse.ArgumentParser(description="Build a domain-restricted vocab head for an exported (fp32) MLM. "
+                                 "UNVALIDATED: its catch-all column is an approximation not yet checked against the "
+                                 "full head on the real model; run evaluate.py --compare_vocab_head before using it.")
+    ap.add_argument("--model", default="distilbert-base-uncased", help="tokenizer")
+    ap.add_argument("--onnx", default="models/distilbert-base-uncased.onnx", help="unquantized export (python -m src.export_onnx)")
+    ap.add_argument("--out", default="models/distilbert-base-uncased.domain.onnx")
+    ap.add_argument("--quant_out", default="models/distilbert-base-uncased.domain.int8.onnx")
+    ap.add_argument("--corpus", nargs="+", default=["data/noisy_transcripts.jsonl", "data/gold.jsonl"],
+                    help="domain text: JSONL with a 'text' field, or plain text lines")
+    ap.add_argument("--names", default="data/names_lexicon.txt")
+    ap.add_argument("--misspell", default="data/misspell_map.json")
+    args = ap.parse_args()
+    tok = AutoTokenizer.from_pretrained(args.model)
+    keep = domain_vocab_ids(tok, domain_texts(args.corpus, args.names, args.misspell))
+    vocab, width = restrict_head(args.onnx, args.out, keep)
+    quantize_dynamic(args.out, args.quant_out, weight_type=QuantType.QInt8)
+    print(f"{len(keep)} wordpieces kept + catch-all: head width {vocab} -> {width} ({args.quant_out})")
@@ -0,0 +1,280 @@
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional
+
+# Work queue for batch jobs: chunk ids are leased to one worker at a time. A
+# lease not renewed within lease_s is abandoned (worker died or hung) and the
+# chunk goes back to pending, up to max_attempts leases per chunk, after which
+# it is failed. Delivery is at-least-once, so chunk processing must be
+# idempotent. Lease expiry uses wall clocks: keep lease_s well above the clock
+# skew between hosts.
+#
+# Backends are picked by a spec string, "<scheme>:<location>":
+#   fs:<dir>       - one file per chunk, state = directory, claims by rename;
+#                    works on a filesystem shared by every worker host
+#   sqlite:<path>  - one SQLite table; for workers on one host (SQLite locking
+#                    is unreliable over network filesystems)
+# Another backend subclasses WorkQueue and registers in QUEUE_BACKENDS.
+
+CHUNK_STATES = ('pending', 'leased', 'done', 'failed')
+
+
+@dataclass
+class Lease:
+    chunk: str
+    token: str
+    attempt: int
+
+
+def new_token() -> str:
+    """Identity of one lease holder: host, pid and a random suffix"""
+    host = socket.gethostname().replace('.', '_')
+    return f"{host}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+
+class WorkQueue:
+    """
+    Interface of a chunk work queue.
+    - put(chunks): add chunk ids as pending; ids already known are left alone
+    - lease(): claim the next pending (or abandoned) chunk, None if there is none
+    - reap(): return abandoned leases to pending (failed after the last attempt);
+      lease() reaps first, and a coordinator reaps while it waits
+    - renew(lease): extend a held lease; False once it was lost
+    - complete(lease) / fail(lease, error): release it as done, or for a retry
+    - counts(): chunks per state (CHUNK_STATES); errors(): last error per chunk
+    """
+
+    def __init__(self, lease_s: float = 300, max_attempts: int = 3):
+        if lease_s <= 0 or max_attempts < 1:
+            raise ValueError("lease_s must be > 0 and max_attempts >= 1")
+        self.lease_s = lease_s
+        self.max_attempts = max_attempts
+
+    def put(self, chunks: Iterable[str]):
+        raise NotImplementedError
+
+    def lease(self) -> Optional[Lease]:
+        raise NotImplementedError
+
+    def reap(self) -> int:
+        """Release every expired lease; returns how many"""
+        raise NotImplementedError
+
+    def renew(self, lease: Lease) -> bool:
+        raise NotImplementedError
+
+    def complete(self, lease: Lease) -> bool:
+        raise NotImplementedError
+
+    def fail(self, lease: Lease, error: str):
+        raise NotImplementedError
+
+    def counts(self) -> Dict[str, int]:
+        raise NotImplementedError
+
+    def errors(self) -> Dict[str, str]:
+        raise NotImplementedError
+
+    def finished(self) -> bool:
+        """Every chunk is done or failed"""
+        c = self.counts()
+        return c['pending'] == 0 and c['leased'] == 0
+
+
+class SQLiteQueue(WorkQueue):
+    """Queue in one SQLite table (WAL mode; one connection per thread)"""
+
+    def __init__(self, path: str, lease_s: float = 300, max_attempts: int = 3):
+        super().__init__(lease_s, max_attempts)
+        self.path = path
+        self._local = threading.local()
+        self._db().execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            " id TEXT PRIMARY KEY, state TEXT NOT NULL, token TEXT, expires REAL,"
+            " attempts INTEGER NOT NULL DEFAULT 0, error TEXT)"
+        )
+
+    def _db(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def put(self, chunks: Iterable[str]):
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        db.executemany("INSERT OR IGNORE INTO chunks (id, state) VALUES (?, 'pending')", [(c,) for c in chunks])
+        db.execute("COMMIT")
+
+    def reap(self) -> int:
+        cur = self._db().execute(
+            "UPDATE chunks SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,"
+            " token = NULL, error = 'lease expired' WHERE state = 'leased' AND expires < ?",
+            (self.max_attempts, time.time()),
+        )
+        return cur.rowcount
+
+    def lease(self) -> Optional[Lease]:
+        self.reap()
+        db = self._db()
+        now = time.time()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute("SELECT id, attempts FROM chunks WHERE state = 'pending' ORDER BY id LIMIT 1").fetchone()
+            if row is None:
+                db.execute("COMMIT")
+                return None
+            lease = Lease(row[0], new_token(), row[1] + 1)
+            db.execute("UPDATE chunks SET state = 'leased', token = ?, expires = ?, attempts = ? WHERE id = ?",
+                       (lease.token, now + self.lease_s, lease.attempt, lease.chunk))
+            db.execute("COMMIT")
+            return lease
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def renew(self, lease: Lease) -> bool:
+        cur = self._db().execute("UPDATE chunks SET expires = ? WHERE id = ? AND token = ? AND state = 'leased'",
+                                 (time.time() + self.lease_s, lease.chunk, lease.token))
+        return cur.rowcount == 1
+
+    def complete(self, lease: Lease) -> bool:
+        cur = self._db().execute("UPDATE chunks SET state = 'done', token = NULL WHERE id = ? AND token = ? AND state = 'leased'",
+                                 (lease.chunk, lease.token))
+        return cur.rowcount == 1
+
+    def fail(self, lease: Lease, error: str):
+        self._db().execute(
+            "UPDATE chunks SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, token = NULL, error = ?"
+            " WHERE id = ? AND token = ? AND state = 'leased'",
+            (self.max_attempts, error, lease.chunk, lease.token),
+        )
+
+    def counts(self) -> Dict[str, int]:
+        out = dict.fromkeys(CHUNK_STATES, 0)
+        out.update(self._db().execute("SELECT state, COUNT(*) FROM chunks GROUP BY state").fetchall())
+        return out
+
+    def errors(self) -> Dict[str, str]:
+        return dict(self._db().execute("SELECT id, error FROM chunks WHERE error IS NOT NULL ORDER BY id").fetchall())
+
+
+class FileQueue(WorkQueue):
+    """
+    Queue as files under root, one per chunk, in a directory per state:
+    pending/<chunk>.<attempts>, leased/<chunk>.<attempt>.<token>, done/<chunk>,
+    failed/<chunk>; errors/<chunk> holds the last error. Every state change is
+    one rename, so exactly one worker wins a claim. A lease is renewed by
+    touching its file and is abandoned once the file's mtime is lease_s old.
+    Chunk ids must not contain dots.
+    """
+
+    def __init__(self, root: str, lease_s: float = 300, max_attempts: int = 3):
+        super().__init__(lease_s, max_attempts)
+        self.root = root
+        for d in CHUNK_STATES + ('errors',):
+            os.makedirs(os.path.join(root, d), exist_ok=True)
+
+    def _path(self, state: str, name: str) -> str:
+        return os.path.join(self.root, state, name)
+
+    def _names(self, state: str):
+        return sorted(os.listdir(os.path.join(self.root, state)))
+
+    def _move(self, src: str, dst: str) -> bool:
+        try:
+            os.rename(src, dst)
+            return True
+        except FileNotFoundError:
+            return False   # someone else moved it first
+
+    def _release(self, lease: Lease, error: str) -> bool:
+        """Move a leased chunk back to pending, or to failed after its last attempt"""
+        src = self._path('leased', f"{lease.chunk}.{lease.attempt}.{lease.token}")
+        if lease.attempt >= self.max_attempts:
+            dst = self._path('failed', lease.chunk)
+        else:
+            dst = self._path('pending', f"{lease.chunk}.{lease.attempt}")
+        if not self._move(src, dst):
+            return False
+        with open(self._path('errors', lease.chunk), 'w', encoding='utf-8') as f:
+            f.write(error)
+        return True
+
+    def put(self, chunks: Iterable[str]):
+        known = {n.split('.', 1)[0] for s in CHUNK_STATES for n in self._names(s)}
+        for c in chunks:
+            if '.' in c:
+                raise ValueError(f"chunk id {c!r} must not contain '.'")
+            if c not in known:
+                open(self._path('pending', f"{c}.0"), 'w').close()
+
+    def reap(self) -> int:
+        now = time.time()
+        reaped = 0
+        for name in self._names('leased'):
+            chunk, attempt, token = name.split('.', 2)
+            try:
+                expired = os.stat(self._path('leased', name)).st_mtime + self.lease_s < now
+            except FileNotFoundError:
+                continue
+            if expired:
+                reaped += self._release(Lease(chunk, token, int(attempt)), "lease expired")
+        return reaped
+
+    def lease(self) -> Optional[Lease]:
+        self.reap()
+        token = new_token()
+        for name in self._names('pending'):
+            chunk, attempts = name.split('.', 1)
+            src = self._path('pending', name)
+            lease = Lease(chunk, token, int(attempts) + 1)
+            try:
+                os.utime(src)   # fresh mtime before the claim, so the new lease is not taken for abandoned
+            except FileNotFoundError:
+                continue
+            if self._move(src, self._path('leased', f"{chunk}.{lease.attempt}.{token}")):
+                return lease
+        return None
+
+    def renew(self, lease: Lease) -> bool:
+        try:
+            os.utime(self._path('leased', f"{lease.chunk}.{lease.attempt}.{lease.token}"))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def complete(self, lease: Lease) -> bool:
+        return self._move(self._path('leased', f"{lease.chunk}.{lease.attempt}.{lease.token}"),
+                          self._path('done', lease.chunk))
+
+    def fail(self, lease: Lease, error: str):
+        self._release(lease, error)
+
+    def counts(self) -> Dict[str, int]:
+        return {s: len(self._names(s)) for s in CHUNK_STATES}
+
+    def errors(self) -> Dict[str, str]:
+        out = {}
+        for c in self._names('errors'):
+            with open(self._path('errors', c), 'r', encoding='utf-8') as f:
+                out[c] = f.read()
+        return out
+
+
+QUEUE_BACKENDS = {'fs': FileQueue, 'sqlite': SQLiteQueue}
+
+
+def open_queue(spec: str, lease_s: float = 300, max_attempts: int = 3) -> WorkQueue:
+    """Queue for a spec like 'fs:out/job/queue' or 'sqlite:out/job/queue.db'"""
+    scheme, sep, location = spec.partition(':')
+    if not sep or scheme not in QUEUE_BACKENDS:
+        raise ValueError(f"queue spec must be '<backend>:<location>' with a backend in {sorted(QUEUE_BACKENDS)}, got {spec!r}")
+    return QUEUE_BACKENDS[scheme](location, lease_s=lease_s, max_attempts=max_attempts)
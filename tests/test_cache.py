@@ -0,0 +1,91 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+import unittest
+
+from src.cache import ResultCache, file_fingerprint, normalize_key
+
+TTL_S = 0.3
+
+
+class ResultCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.db = os.path.join(self.dir, "cache.db")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def rows(self):
+        with sqlite3.connect(self.db) as conn:
+            return sorted(conn.execute("SELECT fingerprint, key FROM results").fetchall())
+
+    def test_normalize_key(self):
+        self.assertEqual(normalize_key("  café  au\tlait "), "café au lait")
+
+    def test_ttl_expiry(self):
+        cache = ResultCache(ttl_s=TTL_S, path=self.db)
+        cache.put("fp", "a", "A.")
+        self.assertEqual(cache.get("fp", "a"), "A.")
+        time.sleep(TTL_S * 1.5)
+        # Expired in memory and on disk, for this process and a fresh one
+        self.assertIsNone(cache.get("fp", "a"))
+        self.assertIsNone(ResultCache(ttl_s=TTL_S, path=self.db).get("fp", "a"))
+        self.assertEqual(self.rows(), [])   # purged when the second cache opened the store
+
+    def test_shared_store_across_processes(self):
+        ResultCache(path=self.db).put("fp", "a", "A.")
+        other = ResultCache(path=self.db)
+        self.assertEqual(other.get("fp", "a"), "A.")
+        self.assertEqual(other.stats()["hits_disk"], 1)
+
+    def test_new_fingerprint_misses(self):
+        cache = ResultCache(path=self.db)
+        cache.put("fp1", "a", "A.")
+        self.assertIsNone(cache.get("fp2", "a"))
+        self.assertEqual(cache.get("fp1", "a"), "A.")
+
+    def test_file_fingerprint_tracks_edits(self):
+        path = os.path.join(self.dir, "map.json")
+        self.assertEqual(file_fingerprint(path), "")
+        with open(path, 'w') as f:
+            f.write("{}")
+        before = file_fingerprint(path)
+        with open(path, 'w') as f:
+            f.write('{"teh": "the"}')
+        self.assertNotEqual(file_fingerprint(path), before)
+
+    def test_live_fingerprints_share_a_store(self):
+        # Two configurations writing to one store keep each other's rows
+        a, b = ResultCache(path=self.db), ResultCache(path=self.db)
+        for i in range(5):
+            a.put("fp-a", f"k{i}", "x")
+            b.put("fp-b", f"k{i}", "y")
+        a.purge()
+        self.assertEqual(len(self.rows()), 10)
+        self.assertEqual(ResultCache(path=self.db).get("fp-a", "k0"), "x")
+
+    def test_idle_fingerprints_are_purged(self):
+        old = ResultCache(path=self.db, idle_s=TTL_S)
+        old.put("fp-old", "a", "A.")
+        time.sleep(TTL_S * 1.5)
+        live = ResultCache(path=self.db, idle_s=TTL_S)   # purges on open
+        live.put("fp-new", "a", "a.")
+        self.assertEqual(self.rows(), [("fp-new", "a")])
+
+    def test_reads_keep_a_fingerprint_alive(self):
+        ResultCache(path=self.db, idle_s=TTL_S).put("fp", "a", "A.")
+        reader = ResultCache(path=self.db, idle_s=TTL_S)
+        reader.TOUCH_EVERY_S = 0
+        for _ in range(3):
+            time.sleep(TTL_S * 0.6)
+            reader._mem.clear()
+            self.assertEqual(reader.get("fp", "a"), "A.")
+        ResultCache(path=self.db, idle_s=TTL_S)
+        self.assertEqual(self.rows(), [("fp", "a")])
+
+
+if __name__ == "__main__":
+    unittest.main()
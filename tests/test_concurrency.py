@@ -0,0 +1,127 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import numpy as np
+
+try:
+    import onnx
+    from onnx import TensorProto, helper, numpy_helper
+    import onnxruntime
+    from transformers import BertTokenizerFast
+except ImportError:
+    onnx = None
+
+DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+THREADS = 8
+INFERENCE_THREADS = 2
+REPEAT = 3
+
+
+def build_tiny_mlm(out_dir: str, texts):
+    """Word-level vocab over texts and a 16-dim ONNX 'MLM': logits = (emb + mean context emb) @ W"""
+    words = sorted({w for t in texts for w in t.lower().split()})
+    vocab = list(dict.fromkeys(['[PAD]', '[UNK]', '[CLS]', '[SEP]', '[MASK]'] + words + sorted(set(''.join(words)))))
+    vocab_path = os.path.join(out_dir, "vocab.txt")
+    with open(vocab_path, 'w', encoding='utf-8') as f:
+        f.write("\n".join(vocab) + "\n")
+    BertTokenizerFast(vocab_path, do_lower_case=True).save_pretrained(out_dir)
+    rng = np.random.default_rng(0)
+    V = len(vocab)
+    nodes = [
+        helper.make_node('Gather', ['E', 'input_ids'], ['h']),
+        helper.make_node('Cast', ['attention_mask'], ['am'], to=TensorProto.FLOAT),
+        helper.make_node('Unsqueeze', ['am', 'last'], ['am3']),
+        helper.make_node('Mul', ['h', 'am3'], ['hm']),
+        helper.make_node('ReduceMean', ['hm', 'seq'], ['ctx'], keepdims=1),
+        helper.make_node('Add', ['h', 'ctx'], ['h2']),
+        helper.make_node('MatMul', ['h2', 'W'], ['logits']),
+    ]
+    graph = helper.make_graph(
+        nodes, 'tiny',
+        [helper.make_tensor_value_info('input_ids', TensorProto.INT64, ['batch', 'seq']),
+         helper.make_tensor_value_info('attention_mask', TensorProto.INT64, ['batch', 'seq'])],
+        [helper.make_tensor_value_info('logits', TensorProto.FLOAT, ['batch', 'seq', V])],
+        [numpy_helper.from_array(rng.standard_normal((V, 16)).astype(np.float32), 'E'),
+         numpy_helper.from_array(rng.standard_normal((16, V)).astype(np.float32), 'W'),
+         numpy_helper.from_array(np.array([-1], dtype=np.int64), 'last'),
+         numpy_helper.from_array(np.array([1], dtype=np.int64), 'seq')],
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid('', 18)])
+    model.ir_version = 9
+    path = os.path.join(out_dir, "tiny.onnx")
+    onnx.save(model, path)
+    return path
+
+
+@unittest.skipIf(onnx is None, "needs onnx, onnxruntime and transformers")
+class ConcurrentPostProcessorTest(unittest.TestCase):
+    """One PostProcessor in concurrent mode shared by THREADS caller threads"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.dir = tempfile.mkdtemp()
+        with open(os.path.join(DATA, "noisy_transcripts.jsonl"), 'r', encoding='utf-8') as f:
+            cls.texts = [json.loads(line)["text"] for line in f][:20]
+        cls.onnx_path = build_tiny_mlm(cls.dir, cls.texts)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.dir)
+
+    def make(self, **kw):
+        from src.postprocess_pipeline import PostProcessor
+        # The ranker loads its tokenizer by model name; serve the tiny one instead
+        local = lambda name, **_: BertTokenizerFast.from_pretrained(self.dir)
+        with mock.patch("src.ranker_onnx.AutoTokenizer.from_pretrained", side_effect=local):
+            pp = PostProcessor(os.path.join(DATA, "names_lexicon.txt"), onnx_model_path=self.onnx_path,
+                               misspell_map_path=os.path.join(DATA, "misspell_map.json"),
+                               inference_threads=INFERENCE_THREADS, profile_path=None, **kw)
+        self.addCleanup(pp.ranker.close)
+        return pp
+
+    def assert_threads_match_sequential(self, pp):
+        reference = [pp.process_one(t) for t in self.texts]
+        work = list(range(len(self.texts))) * REPEAT
+        outs, errors = {}, []
+        start = threading.Barrier(THREADS)
+
+        def run(me):
+            try:
+                start.wait()
+                for j in work[me::THREADS]:
+                    outs.setdefault(j, set()).add(pp.process_one(self.texts[j]))
+            except BaseException as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(THREADS)]
+        # Switch threads as often as possible so unsafe sharing shows up even on one core
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        finally:
+            sys.setswitchinterval(interval)
+        self.assertEqual(errors, [])
+        self.assertEqual(outs, {i: {r} for i, r in enumerate(reference)})
+
+    def test_candidates(self):
+        self.assert_threads_match_sequential(self.make())
+
+    def test_lattice(self):
+        self.assert_threads_match_sequential(self.make(search='lattice'))
+
+    def test_sampled_pll_with_cache(self):
+        self.assert_threads_match_sequential(self.make(pll_k=2, cache_size=8))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import io
+import json
+import unittest
+
+import worker
+from src.framing import HEADER, encode, read_frame
+
+
+class UpperProcessor:
+    """Stand-in for PostProcessor: uppercases, and fails on 'boom'"""
+
+    class replacer:
+        @staticmethod
+        def reload_if_changed():
+            return False
+
+    def process_one(self, text):
+        if text == "boom":
+            raise RuntimeError("boom")
+        return text.upper()
+
+    def process_batch(self, texts):
+        return [self.process_one(t) for t in texts]
+
+
+def run_worker(frames: bytes, batch_size: int = 4):
+    out = io.BytesIO()
+    worker.serve(UpperProcessor(), 'json', batch_size, 1.0, stdin=io.BytesIO(frames), stdout=out)
+    out.seek(0)
+    resps = []
+    while True:
+        r = read_frame(out)
+        if r is None:
+            return resps
+        resps.append(r)
+
+
+class WorkerTest(unittest.TestCase):
+    def test_bad_requests_get_errors_and_the_rest_are_answered(self):
+        bad_json = b"{nope"
+        frames = b"".join([
+            encode({"id": 1, "text": "hello"}),
+            encode({"id": 2}),
+            encode({"id": 3, "text": "  "}),
+            encode({"id": 4, "text": 5}),
+            encode(["not", "an", "object"]),
+            HEADER.pack(len(bad_json)) + bad_json,
+            encode({"id": 5, "text": "boom"}),
+            encode({"id": 6, "text": "bye"}),
+        ])
+        resps = {json.dumps(r.get("id")): r for r in run_worker(frames)}
+        self.assertEqual(resps["1"], {"id": 1, "text": "HELLO"})
+        self.assertEqual(resps["6"], {"id": 6, "text": "BYE"})
+        for i in ("2", "3", "4"):
+            self.assertEqual(resps[i]["error"], "request needs a non-empty text string")
+        self.assertEqual(resps["5"]["error"], "RuntimeError: boom")
+        self.assertEqual(len(run_worker(frames)), 8)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,150 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+import warnings
+
+from src import batch_job
+from src.workqueue import FileQueue, SQLiteQueue, open_queue
+
+LEASE_S = 0.5
+
+
+class QueueContract:
+    """Lease / expiry / retry behaviour every backend must share"""
+
+    def make(self, max_attempts=2):
+        raise NotImplementedError
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_lease_in_order_once(self):
+        q = self.make()
+        q.put(["000001", "000000"])
+        q.put(["000000"])   # known ids are ignored
+        a, b = q.lease(), q.lease()
+        self.assertEqual((a.chunk, b.chunk), ("000000", "000001"))
+        self.assertIsNone(q.lease())
+        self.assertTrue(q.complete(a) and q.complete(b))
+        self.assertEqual(q.counts(), {"pending": 0, "leased": 0, "done": 2, "failed": 0})
+        self.assertTrue(q.finished())
+
+    def test_expired_lease_is_retried(self):
+        q = self.make()
+        q.put(["000000"])
+        dead = q.lease()
+        self.assertIsNone(q.lease())
+        time.sleep(LEASE_S * 1.5)
+        again = q.lease()
+        self.assertEqual((again.chunk, again.attempt), ("000000", 2))
+        # The abandoned holder lost its lease
+        self.assertFalse(q.renew(dead))
+        self.assertFalse(q.complete(dead))
+        self.assertTrue(q.complete(again))
+
+    def test_renew_keeps_lease(self):
+        q = self.make()
+        q.put(["000000"])
+        lease = q.lease()
+        for _ in range(3):
+            time.sleep(LEASE_S * 0.6)
+            self.assertTrue(q.renew(lease))
+            self.assertIsNone(q.lease())
+        self.assertTrue(q.complete(lease))
+
+    def test_reap_without_workers(self):
+        q = self.make(max_attempts=1)
+        q.put(["000000", "000001"])
+        q.lease()
+        time.sleep(LEASE_S * 1.5)
+        self.assertEqual(q.reap(), 1)
+        self.assertEqual(q.counts(), {"pending": 1, "leased": 0, "done": 0, "failed": 1})
+        self.assertEqual(q.errors(), {"000000": "lease expired"})
+
+    def test_fail_retries_then_fails(self):
+        q = self.make(max_attempts=2)
+        q.put(["000000"])
+        q.fail(q.lease(), "boom 1")
+        lease = q.lease()
+        self.assertEqual(lease.attempt, 2)
+        q.fail(lease, "boom 2")
+        self.assertIsNone(q.lease())
+        self.assertEqual(q.counts()["failed"], 1)
+        self.assertEqual(q.errors(), {"000000": "boom 2"})
+
+
+class FileQueueTest(QueueContract, unittest.TestCase):
+    def make(self, max_attempts=2):
+        return FileQueue(os.path.join(self.dir, "queue"), lease_s=LEASE_S, max_attempts=max_attempts)
+
+
+class SQLiteQueueTest(QueueContract, unittest.TestCase):
+    def make(self, max_attempts=2):
+        return SQLiteQueue(os.path.join(self.dir, "queue.db"), lease_s=LEASE_S, max_attempts=max_attempts)
+
+
+class BatchJobTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.input = os.path.join(self.dir, "in.jsonl")
+        with open(self.input, 'w', encoding='utf-8') as f:
+            for i in range(10):
+                f.write(json.dumps({"id": i, "text": f"line {i}"}) + "\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_split_work_merge_in_order(self):
+        job_dir = os.path.join(self.dir, "job")
+        job = batch_job.create_job(job_dir, [self.input], chunk_size=3, lease_s=LEASE_S)
+        self.assertEqual(job["chunks"], 4)
+        # A dead worker held chunk 0; a live worker picks it up once the lease expires
+        _, q = batch_job.open_job(job_dir)
+        q.lease()
+        time.sleep(LEASE_S * 1.5)
+        n = batch_job.work(job_dir, lambda texts: [t.upper() for t in texts], poll_s=0.01, log=lambda *a: None)
+        self.assertEqual(n, 4)
+        out = os.path.join(self.dir, "merged.jsonl")
+        self.assertEqual(batch_job.merge(job_dir, out), 10)
+        rows = [json.loads(line) for line in open(out, 'r', encoding='utf-8')]
+        self.assertEqual(rows, [{"id": i, "text": f"LINE {i}"} for i in range(10)])
+
+    def test_wait_reaps_abandoned_leases(self):
+        job_dir = os.path.join(self.dir, "job")
+        batch_job.create_job(job_dir, [self.input], chunk_size=10, lease_s=LEASE_S, max_attempts=1)
+        _, q = batch_job.open_job(job_dir)
+        q.lease()   # the only worker dies holding the only chunk
+        counts = batch_job.wait(job_dir, poll_s=0.05, log=lambda *a: None)
+        self.assertEqual(counts["failed"], 1)
+        with self.assertRaises(RuntimeError):
+            batch_job.merge(job_dir, os.path.join(self.dir, "merged.jsonl"))
+
+    def test_rerun_keeps_settings_and_closes_inputs(self):
+        job_dir = os.path.join(self.dir, "job")
+        spec = "sqlite:" + os.path.join(self.dir, "q.db")
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always", ResourceWarning)
+            batch_job.create_job(job_dir, [self.input], chunk_size=3, queue_spec=spec)
+        self.assertEqual([w for w in caught if issubclass(w.category, ResourceWarning)], [])
+        # Restarting the coordinator with the same settings (or no queue spec) is fine
+        self.assertEqual(batch_job.create_job(job_dir, [self.input], chunk_size=3, queue_spec=spec)["queue"], spec)
+        self.assertEqual(batch_job.create_job(job_dir, [self.input], chunk_size=3)["queue"], spec)
+        with self.assertRaises(ValueError):
+            batch_job.create_job(job_dir, [self.input], chunk_size=3, queue_spec="fs:" + os.path.join(self.dir, "q"))
+        with self.assertRaises(ValueError):
+            batch_job.create_job(job_dir, [self.input], chunk_size=4, queue_spec=spec)
+
+    def test_open_queue_spec(self):
+        self.assertIsInstance(open_queue("sqlite:" + os.path.join(self.dir, "q.db")), SQLiteQueue)
+        with self.assertRaises(ValueError):
+            open_queue("redis://host")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+import argparse, queue, sys, threading, time
+from src.framing import read_frame, write_frame, check_codec, FrameDecodeError
+from src.postprocess_pipeline import PostProcessor
+
+def reader(stream, codec, q):
+    """
+    Decode request frames onto q; None marks the end of input. A frame that does
+    not decode, or is not an object with a non-empty text string, gets an error
+    response; only a broken stream ends the loop.
+    """
+    try:
+        while True:
+            try:
+                req = read_frame(stream, codec)
+            except FrameDecodeError as e:
+                q.put({"id": None, "error": str(e)})
+                continue
+            if req is not None and not isinstance(req, dict):
+                req = {"id": None, "error": "request must be an object with id and text"}
+            elif req is not None and not (isinstance(req.get("text"), str) and req["text"].strip()):
+                req = {"id": req.get("id"), "error": "request needs a non-empty text string"}
+            q.put(req)
+            if req is None:
+                return
+    except Exception as e:
+        q.put(e)
+
+def serve(pp, codec, batch_size, batch_wait_ms, stdin=None, stdout=None):
+    """
+    Answer framed {"id", "text"} requests with framed {"id", "text"} responses
+    (or {"id", "error"}) until stdin closes. Requests that arrive within
+    batch_wait_ms of the first one (up to batch_size) are processed as one batch;
+    each batch's responses are written and flushed as soon as it is done. Edits
+    to the misspelling map are picked up before the next batch.
+    """
+    stdin = stdin or sys.stdin.buffer
+    stdout = stdout or sys.stdout.buffer
+    q = queue.Queue()
+    threading.Thread(target=reader, args=(stdin, codec, q), daemon=True).start()
+    done = False
+    while not done:
+        batch = [q.get()]
+        deadline = time.perf_counter() + batch_wait_ms / 1000
+        while len(batch) < batch_size and isinstance(batch[-1], dict):
+            left = deadline - time.perf_counter()
+            try:
+                batch.append(q.get(timeout=left) if left > 0 else q.get_nowait())
+            except queue.Empty:
+                break
+        if not isinstance(batch[-1], dict):
+            end = batch.pop()
+            done = True
+            if isinstance(end, Exception):
+                print(f"worker: bad input frame: {end}", file=sys.stderr)
+        for r in batch:
+            if "error" in r:
+                write_frame(stdout, r, codec)
+        batch = [r for r in batch if "error" not in r]
+        if not batch:
+            continue
+        # Pick up misspelling-map edits without a restart
+        try:
+            pp.replacer.reload_if_changed()
+        except Exception as e:
+            print(f"worker: misspelling map not reloaded: {e}", file=sys.stderr)
+        try:
+            outs = pp.process_batch([r["text"] for r in batch])
+            resps = [{"id": r.get("id"), "text": o} for r, o in zip(batch, outs)]
+        except Exception:
+            # Retry one by one so a bad request only fails itself
+            resps = []
+            for r in batch:
+                try:
+                    resps.append({"id": r.get("id"), "text": pp.process_one(r["text"])})
+                except Exception as e:
+                    resps.append({"id": r.get("id"), "error": f"{type(e).__name__}: {e}"})
+        for resp in resps:
+            write_frame(stdout, resp, codec)
+
+def main():
+    """Long-lived post-processor: framed requests on stdin, framed responses on stdout (see src/framing.py)"""
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--names", default="data/names_lexicon.txt")
+    ap.add_argument("--misspell", default="data/misspell_map.json")
+    ap.add_argument("--onnx", default="models/distilbert-base-uncased.int8.onnx")
+    ap.add_argument("--device", default="cpu")
+    ap.add_argument("--codec", default="json", choices=["json", "msgpack"])
+    ap.add_argument("--batch_size", type=int, default=1, help="max requests per micro-batch (1 = no batching)")
+    ap.add_argument("--batch_wait_ms", type=float, default=2.0, help="how long a micro-batch waits for more requests")
+    ap.add_argument("--cache_size", type=int, default=0, help="in-process result cache entries (0 = off)")
+    ap.add_argument("--prerank", action="store_true", help="drop dominated candidates with a cheap cascade before the MLM "
+                    "(WER/punct F1 parity checked on a toy model only, not yet on the real one)")
+    ap.add_argument("--layers", type=int, default=None, help="rank with the N-layer model tier (python -m src.export_onnx --layers N; "
+                    "unmeasured: check it with evaluate.py --compare_layers first)")
+    ap.add_argument("--punctuation", default="rules", choices=["rules", "tagger"], help="punctuation/casing from the rules or the token tagger")
+    ap.add_argument("--tagger", default="models/punct_tagger.onnx", help="punctuation tagger model (python -m src.punct_tagger)")
+    ap.add_argument("--profile", default="models/tuned_profile.json", help="tuned host profile (python -m src.autotune); '' = defaults")
+    args = ap.parse_args()
+    check_codec(args.codec)
+    pp = PostProcessor(args.names, onnx_model_path=args.onnx, device=args.device, misspell_map_path=args.misspell,
+                       cache_size=args.cache_size, prerank=args.prerank,
+                       ranker_layers=args.layers, punctuation=args.punctuation, tagger_path=args.tagger,
+                       profile_path=args.profile or None)
+    # stdout carries frames only; anything else goes to stderr
+    out = sys.stdout.buffer
+    sys.stdout = sys.stderr
+    print("worker: ready", file=sys.stderr, flush=True)
+    serve(pp, args.codec, max(1, args.batch_size), args.batch_wait_ms, stdout=out)
+
+if __name__ == "__main__":
+    main()